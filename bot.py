@@ -3,11 +3,13 @@ import logging
 
 from aiogram import Bot, Dispatcher
 from aiogram.enums import ParseMode
-from aiogram.fsm.storage.memory import MemoryStorage
 
-from config import TELEGRAM_BOT_TOKEN
-from database import Database
+from config import TELEGRAM_BOT_TOKEN, RECOMMENDATION_MODE, POOL_REFRESH_ENABLED, STATS_LOG_INTERVAL
+from database import Database, SQLiteStorage
 from handlers import setup_routers
+from services import TMDBService, AIService
+from services.pools import run_pool_scheduler
+from utils.background import spawn, cancel_background_tasks
 
 # Configure logging
 logging.basicConfig(
@@ -17,25 +19,62 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
-async def main():
-    # Initialize bot and dispatcher
-    bot = Bot(token=TELEGRAM_BOT_TOKEN, parse_mode=ParseMode.MARKDOWN)
-    storage = MemoryStorage()
-    dp = Dispatcher(storage=storage)
+def log_service_stats(tmdb: TMDBService, ai: AIService):
+    """Log the TMDB cache, TMDB request and AI usage counters."""
+    logger.info(f"TMDB cache: {tmdb.cache_stats()}")
+    logger.info(f"TMDB requests: {tmdb.request_stats()}")
+    logger.info(f"AI usage: {ai.usage_stats()}")
+
+
+async def run_stats_logger(tmdb: TMDBService, ai: AIService):
+    """Log service counters every STATS_LOG_INTERVAL seconds."""
+    while True:
+        await asyncio.sleep(STATS_LOG_INTERVAL)
+        log_service_stats(tmdb, ai)
 
+
+async def main():
     # Initialize database
     db = Database()
     await db.connect()
     logger.info("Database connected")
 
+    # Initialize bot and dispatcher; survey state is persisted next to the rest of the data
+    bot = Bot(token=TELEGRAM_BOT_TOKEN, parse_mode=ParseMode.MARKDOWN)
+    storage = SQLiteStorage(db)
+    dp = Dispatcher(storage=storage)
+
+    # Initialize shared TMDB HTTP client, backed by the persistent movie cache
+    tmdb = TMDBService(db)
+    await tmdb.connect()
+
+    # Initialize async Anthropic client
+    ai = AIService()
+
+    # Rebuild precomputed candidate pools during quiet hours
+    if RECOMMENDATION_MODE == "ai" and POOL_REFRESH_ENABLED:
+        spawn(run_pool_scheduler(db, tmdb, ai), name="candidate-pools")
+
+    if STATS_LOG_INTERVAL > 0:
+        spawn(run_stats_logger(tmdb, ai), name="service-stats")
+
     # Setup routers
     main_router = setup_routers()
     dp.include_router(main_router)
 
-    # Inject database into handlers via middleware
+    # Inject database and services into handlers via middleware
     @dp.update.middleware()
     async def db_middleware(handler, event, data):
         data["db"] = db
+        data["tmdb"] = tmdb
+        data["ai"] = ai
+        return await handler(event, data)
+
+    # Load the sender's users row once per update; handlers take it as `user` (None if new)
+    @dp.update.middleware()
+    async def user_middleware(handler, event, data):
+        from_user = data.get("event_from_user")
+        data["user"] = await db.get_user(from_user.id) if from_user else None
         return await handler(event, data)
 
     # Start polling
@@ -43,6 +82,11 @@ async def main():
     try:
         await dp.start_polling(bot, allowed_updates=dp.resolve_used_update_types())
     finally:
+        await cancel_background_tasks()
+        log_service_stats(tmdb, ai)
+        await storage.close()
+        await ai.close()
+        await tmdb.disconnect()
         await db.disconnect()
         await bot.session.close()
         logger.info("Bot stopped")
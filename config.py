@@ -10,4 +10,114 @@ TMDB_API_KEY = os.getenv("TMDB_API_KEY")
 TMDB_BASE_URL = "https://api.themoviedb.org/3"
 TMDB_IMAGE_BASE_URL = "https://image.tmdb.org/t/p/w500"
 
+# TMDB HTTP client
+TMDB_TIMEOUT = float(os.getenv("TMDB_TIMEOUT", "30"))
+TMDB_MAX_CONNECTIONS = int(os.getenv("TMDB_MAX_CONNECTIONS", "20"))
+TMDB_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("TMDB_MAX_KEEPALIVE_CONNECTIONS", "10"))
+TMDB_KEEPALIVE_EXPIRY = float(os.getenv("TMDB_KEEPALIVE_EXPIRY", "30"))
+TMDB_HTTP2 = os.getenv("TMDB_HTTP2", "true").lower() in ("1", "true", "yes")
+
+# In-memory TMDB cache
+TMDB_CACHE_MAXSIZE = int(os.getenv("TMDB_CACHE_MAXSIZE", "2048"))
+TMDB_CACHE_TTL = float(os.getenv("TMDB_CACHE_TTL", "21600"))
+
+# Service counters (TMDB cache hits/misses/evictions, collapsed TMDB requests, AI usage) are logged this often (seconds)
+STATS_LOG_INTERVAL = float(os.getenv("STATS_LOG_INTERVAL", "3600"))
+
+# Persistent TMDB metadata cache (movie_cache table); older rows are refetched
+MOVIE_CACHE_MAX_AGE = float(os.getenv("MOVIE_CACHE_MAX_AGE", "604800"))
+
+# Anthropic client
+AI_MODEL = os.getenv("AI_MODEL", "claude-3-haiku-20240307")
+AI_MAX_CONCURRENCY = int(os.getenv("AI_MAX_CONCURRENCY", "5"))
+# Of those, how many speculative background calls (queue refills, pool builds) may hold at once,
+# so user-facing calls always find a free slot
+AI_BACKGROUND_CONCURRENCY = int(os.getenv("AI_BACKGROUND_CONCURRENCY", "2"))
+AI_RECOMMENDATIONS_TIMEOUT = float(os.getenv("AI_RECOMMENDATIONS_TIMEOUT", "30"))
+AI_REASON_TIMEOUT = float(os.getenv("AI_REASON_TIMEOUT", "15"))
+AI_MAX_RETRIES = int(os.getenv("AI_MAX_RETRIES", "1"))
+# Stream recommendation completions so TMDB resolution starts with the first parsed candidate
+AI_STREAMING = os.getenv("AI_STREAMING", "true").lower() in ("1", "true", "yes")
+# Mark the prompt prefix as cacheable once it reaches the model's minimum cacheable size
+# (2048 tokens for Haiku, 1024 for Sonnet/Opus); shorter prefixes are never cached
+AI_PROMPT_CACHING = os.getenv("AI_PROMPT_CACHING", "true").lower() in ("1", "true", "yes")
+AI_CACHE_MIN_TOKENS = int(os.getenv("AI_CACHE_MIN_TOKENS", "2048"))
+
+# Exclusion-aware AI prompts: recently seen titles listed in the prompt, and how many
+# suggestions to ask for; the count grows with the user's share of wasted suggestions
+AI_EXCLUDED_TITLES = int(os.getenv("AI_EXCLUDED_TITLES", "50"))
+AI_CANDIDATES = int(os.getenv("AI_CANDIDATES", "5"))
+AI_MAX_CANDIDATES = int(os.getenv("AI_MAX_CANDIDATES", "12"))
+
+# Per-recommendation time budget (seconds): past the soft deadline the LLM-free fallback
+# races the AI path; nothing user-facing waits past the hard deadline
+REC_SOFT_DEADLINE = float(os.getenv("REC_SOFT_DEADLINE", "4"))
+REC_HARD_DEADLINE = float(os.getenv("REC_HARD_DEADLINE", "25"))
+
+# Per-session queue of resolved AI candidates; refilled in the background below this size
+CANDIDATE_QUEUE_LOW_WATERMARK = int(os.getenv("CANDIDATE_QUEUE_LOW_WATERMARK", "2"))
+
+# "ai" asks the LLM first; "local" ranks TMDB candidates locally and never calls it
+RECOMMENDATION_MODE = os.getenv("RECOMMENDATION_MODE", "ai")
+
+# Local ranking engine: discover pages fetched per genre, and how long a pool is reused
+LOCAL_POOL_PAGES = int(os.getenv("LOCAL_POOL_PAGES", "2"))
+LOCAL_POOL_TTL = float(os.getenv("LOCAL_POOL_TTL", "3600"))
+
+# Collaborative filtering batch job (python -m services.collaborative)
+CF_FACTORS = int(os.getenv("CF_FACTORS", "32"))
+CF_NEIGHBORS = int(os.getenv("CF_NEIGHBORS", "30"))
+CF_MIN_USERS = int(os.getenv("CF_MIN_USERS", "2"))
+
+# TF-IDF similarity index over movie_cache; new rows are indexed at most this often (seconds)
+SIMILARITY_REFRESH_INTERVAL = float(os.getenv("SIMILARITY_REFRESH_INTERVAL", "300"))
+
+# Local title -> TMDB id catalog (python -m services.catalog <export>); minimum match score to trust it
+CATALOG_MIN_SCORE = float(os.getenv("CATALOG_MIN_SCORE", "0.85"))
+
+# Memo of AI (title, year) -> tmdb_id resolutions; "not found" results expire sooner
+TITLE_MEMO_TTL = float(os.getenv("TITLE_MEMO_TTL", "2592000"))
+TITLE_MEMO_NEGATIVE_TTL = float(os.getenv("TITLE_MEMO_NEGATIVE_TTL", "86400"))
+
+# Resolved AI candidates shared across users with the same profile and survey answers
+REC_CACHE_TTL = float(os.getenv("REC_CACHE_TTL", "21600"))
+REC_CACHE_MAXSIZE = int(os.getenv("REC_CACHE_MAXSIZE", "2000"))
+REC_CACHE_MAX_CANDIDATES = int(os.getenv("REC_CACHE_MAX_CANDIDATES", "30"))
+
+# Precomputed candidate pools per survey context x liked genre (services.pools), built daily
+# at POOL_REFRESH_HOUR within an LLM request/token budget; pools older than POOL_MAX_AGE are not served
+POOL_REFRESH_ENABLED = os.getenv("POOL_REFRESH_ENABLED", "true").lower() in ("1", "true", "yes")
+POOL_REFRESH_HOUR = int(os.getenv("POOL_REFRESH_HOUR", "4"))
+POOL_REQUEST_BUDGET = int(os.getenv("POOL_REQUEST_BUDGET", "200"))
+POOL_TOKEN_BUDGET = int(os.getenv("POOL_TOKEN_BUDGET", "400000"))
+POOL_SIZE = int(os.getenv("POOL_SIZE", "10"))
+POOL_MAX_AGE = float(os.getenv("POOL_MAX_AGE", "172800"))
+POOL_DEMAND_DAYS = int(os.getenv("POOL_DEMAND_DAYS", "30"))
+
 DATABASE_PATH = "film_bot.db"
+
+# SQLite tuning: WAL lets reads run next to the single writer connection;
+# DB_READ_POOL_SIZE read-only connections serve SELECTs (0 keeps everything on the writer)
+DB_WAL = os.getenv("DB_WAL", "true").lower() in ("1", "true", "yes")
+DB_SYNCHRONOUS = os.getenv("DB_SYNCHRONOUS", "NORMAL")
+DB_BUSY_TIMEOUT = int(os.getenv("DB_BUSY_TIMEOUT", "5000"))
+DB_CACHE_SIZE = int(os.getenv("DB_CACHE_SIZE", "-65536"))
+DB_MMAP_SIZE = int(os.getenv("DB_MMAP_SIZE", "268435456"))
+DB_READ_POOL_SIZE = int(os.getenv("DB_READ_POOL_SIZE", "4"))
+
+# Group commit: writes from concurrent handlers wait up to DB_WRITE_BATCH_DELAY seconds
+# and share one transaction (one fsync) instead of committing one by one
+DB_WRITE_BATCHING = os.getenv("DB_WRITE_BATCHING", "false").lower() in ("1", "true", "yes")
+DB_WRITE_BATCH_DELAY = float(os.getenv("DB_WRITE_BATCH_DELAY", "0.005"))
+DB_WRITE_BATCH_MAX = int(os.getenv("DB_WRITE_BATCH_MAX", "500"))
+
+# In-process LRU of users rows, loaded once per update for handlers
+USER_CACHE_MAXSIZE = int(os.getenv("USER_CACHE_MAXSIZE", "10000"))
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", "3600"))
+
+# Persistent FSM storage: surveys idle longer than FSM_STATE_TTL seconds are dropped;
+# changes are written every FSM_FLUSH_INTERVAL seconds, recent keys are kept in memory
+FSM_STATE_TTL = float(os.getenv("FSM_STATE_TTL", "604800"))
+FSM_FLUSH_INTERVAL = float(os.getenv("FSM_FLUSH_INTERVAL", "1"))
+FSM_PRUNE_INTERVAL = float(os.getenv("FSM_PRUNE_INTERVAL", "3600"))
+FSM_CACHE_MAXSIZE = int(os.getenv("FSM_CACHE_MAXSIZE", "5000"))
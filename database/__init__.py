@@ -1,3 +1,4 @@
 from .db import Database
+from .fsm_storage import SQLiteStorage
 
-__all__ = ["Database"]
+__all__ = ["Database", "SQLiteStorage"]
@@ -0,0 +1,114 @@
+"""
+Latency benchmark of the per-card exclusion lookups on a large synthetic history.
+
+Seeds a throwaway database with USERS users, each with sessions and shown
+recommendations (ROWS recommendations in total), then times
+get_shown_movie_ids and get_recent_excluded_titles for random users:
+
+    python -m database.benchmark [--rows 2000000] [--users 20000] [--queries 2000]
+"""
+import argparse
+import asyncio
+import logging
+import os
+import random
+import tempfile
+import time
+
+from database import Database
+
+logger = logging.getLogger(__name__)
+
+SESSIONS_PER_USER = 10
+BATCH_SIZE = 50000
+
+
+async def seed(db: Database, users: int, rows: int):
+    """Bulk-insert users, sessions and recommendations straight through the writer connection."""
+    conn = db.connection
+    await conn.executemany(
+        "INSERT INTO users (telegram_id) VALUES (?)",
+        [(user_id,) for user_id in range(1, users + 1)]
+    )
+    await conn.executemany(
+        "INSERT INTO recommendation_sessions (id, user_id, dynamic_answers) VALUES (?, ?, '{}')",
+        [
+            (user_id * SESSIONS_PER_USER + n, user_id)
+            for user_id in range(1, users + 1)
+            for n in range(SESSIONS_PER_USER)
+        ]
+    )
+
+    rng = random.Random(42)
+    for start in range(0, rows, BATCH_SIZE):
+        batch = []
+        for _ in range(min(BATCH_SIZE, rows - start)):
+            user_id = rng.randint(1, users)
+            session_id = user_id * SESSIONS_PER_USER + rng.randrange(SESSIONS_PER_USER)
+            tmdb_id = rng.randint(1, 50000)
+            shown_at = f"2025-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d} {rng.randint(0, 23):02d}:00:00"
+            batch.append((session_id, user_id, tmdb_id, f"Movie {tmdb_id}", shown_at))
+        await conn.executemany(
+            """INSERT INTO recommendations (session_id, user_id, tmdb_id, title, shown_at)
+               VALUES (?, ?, ?, ?, ?)""",
+            batch
+        )
+    await conn.commit()
+    await conn.execute("ANALYZE")
+    await conn.commit()
+
+
+async def measure(label: str, query, user_ids: list[int]):
+    timings = []
+    for user_id in user_ids:
+        start = time.perf_counter()
+        await query(user_id)
+        timings.append((time.perf_counter() - start) * 1000)
+
+    timings.sort()
+    p50 = timings[len(timings) // 2]
+    p99 = timings[int(len(timings) * 0.99)]
+    logger.info(f"{label}: p50 {p50:.3f} ms, p99 {p99:.3f} ms over {len(timings)} queries")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=2_000_000)
+    parser.add_argument("--users", type=int, default=20_000)
+    parser.add_argument("--queries", type=int, default=2000)
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(prefix="film_bot_bench_"), "bench.db")
+    db = Database(path)
+    await db.connect()
+    try:
+        start = time.perf_counter()
+        await seed(db, args.users, args.rows)
+        logger.info(f"Seeded {args.rows} recommendations for {args.users} users in {time.perf_counter() - start:.1f} s")
+
+        rng = random.Random(7)
+        user_ids = [rng.randint(1, args.users) for _ in range(args.queries)]
+        await measure("get_shown_movie_ids", db.get_shown_movie_ids, user_ids)
+        await measure("get_recent_excluded_titles", db.get_recent_excluded_titles, user_ids)
+
+        cursor = await db.connection.execute(
+            """EXPLAIN QUERY PLAN SELECT tmdb_id FROM recommendations WHERE user_id = ?
+               GROUP BY tmdb_id ORDER BY MAX(shown_at) DESC LIMIT ?""",
+            (1, 100)
+        )
+        for row in await cursor.fetchall():
+            logger.info(f"Plan: {row[-1]}")
+    finally:
+        await db.disconnect()
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+        os.rmdir(os.path.dirname(path))
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+    )
+    asyncio.run(main())
@@ -1,24 +1,251 @@
 import aiosqlite
+import asyncio
 import json
+import logging
+import sqlite3
+from contextlib import asynccontextmanager
 from datetime import datetime
-from typing import Optional
-from config import DATABASE_PATH
+from typing import AsyncIterator, Awaitable, Callable, Optional, TypeVar
+from config import (
+    DATABASE_PATH,
+    DB_WAL,
+    DB_SYNCHRONOUS,
+    DB_BUSY_TIMEOUT,
+    DB_CACHE_SIZE,
+    DB_MMAP_SIZE,
+    DB_READ_POOL_SIZE,
+    DB_WRITE_BATCHING,
+    DB_WRITE_BATCH_DELAY,
+    DB_WRITE_BATCH_MAX,
+    USER_CACHE_MAXSIZE,
+    USER_CACHE_TTL,
+)
+from utils.cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Schema changes applied once, in order; PRAGMA user_version records the last one applied
+MIGRATIONS = [
+    # 1: per-user lookups without full scans; user_id is copied onto recommendations
+    # so the exclusion lookup reads one covering index instead of joining sessions
+    """
+    ALTER TABLE recommendations ADD COLUMN user_id INTEGER;
+    UPDATE recommendations SET user_id = (
+        SELECT s.user_id FROM recommendation_sessions s WHERE s.id = recommendations.session_id
+    );
+    CREATE INDEX IF NOT EXISTS idx_recommendations_user
+        ON recommendations(user_id, tmdb_id, shown_at);
+    CREATE INDEX IF NOT EXISTS idx_recommendations_session ON recommendations(session_id);
+    CREATE INDEX IF NOT EXISTS idx_sessions_user ON recommendation_sessions(user_id, created_at);
+    CREATE INDEX IF NOT EXISTS idx_sessions_created ON recommendation_sessions(created_at);
+    CREATE INDEX IF NOT EXISTS idx_saved_movies_added ON saved_movies(user_id, added_at);
+    """,
+]
 
 
 class Database:
     def __init__(self, db_path: str = DATABASE_PATH):
         self.db_path = db_path
         self.connection: Optional[aiosqlite.Connection] = None
+        self.catalog_available = False
+        # Read-only connections for SELECTs; all writes stay on self.connection
+        self._readers: list[aiosqlite.Connection] = []
+        self._idle_readers: Optional[asyncio.Queue] = None
+        # Pending (op, future) writes and the task committing them in groups
+        self._write_queue: Optional[asyncio.Queue] = None
+        self._write_task: Optional[asyncio.Task] = None
+        # Write-through cache of users rows, kept current by the user write methods below
+        self.user_cache = TTLCache(USER_CACHE_MAXSIZE, USER_CACHE_TTL)
+        # telegram_id -> number of writes to the row, so a read that raced a write is not cached
+        self._user_generations: dict[int, int] = {}
 
     async def connect(self):
         self.connection = await aiosqlite.connect(self.db_path)
         self.connection.row_factory = aiosqlite.Row
+        await self._apply_pragmas(self.connection)
+        if DB_WAL and self.db_path != ":memory:":
+            cursor = await self.connection.execute("PRAGMA journal_mode=WAL")
+            mode = (await cursor.fetchone())[0]
+            if mode != "wal":
+                logger.warning(f"SQLite stayed in {mode} journal mode")
         await self._create_tables()
+        await self._create_catalog_tables()
+        await self._open_readers()
+        if DB_WRITE_BATCHING:
+            self._write_queue = asyncio.Queue()
+            self._write_task = asyncio.create_task(
+                self._flush_writes(self._write_queue), name="db-writes"
+            )
 
     async def disconnect(self):
+        if self._write_task:
+            # Commit everything queued, including writes that arrive while the last batch runs
+            self._write_queue.put_nowait(None)
+            if not self._write_task.done():
+                await self._write_task
+            queue, self._write_queue, self._write_task = self._write_queue, None, None
+            leftovers = []
+            while not queue.empty():
+                item = queue.get_nowait()
+                if item is not None:
+                    leftovers.append(item)
+            if leftovers:
+                await self._commit_batch(leftovers)
+        for reader in self._readers:
+            await reader.close()
+        self._readers = []
+        self._idle_readers = None
         if self.connection:
             await self.connection.close()
 
+    async def _apply_pragmas(self, conn: aiosqlite.Connection):
+        await conn.execute(f"PRAGMA busy_timeout={DB_BUSY_TIMEOUT}")
+        await conn.execute(f"PRAGMA synchronous={DB_SYNCHRONOUS}")
+        await conn.execute(f"PRAGMA cache_size={DB_CACHE_SIZE}")
+        await conn.execute(f"PRAGMA mmap_size={DB_MMAP_SIZE}")
+        await conn.execute("PRAGMA temp_store=MEMORY")
+
+    async def _open_readers(self):
+        # Without WAL readers would block on the writer; an in-memory DB is per-connection
+        if not DB_WAL or DB_READ_POOL_SIZE <= 0 or self.db_path == ":memory:":
+            return
+
+        self._idle_readers = asyncio.Queue()
+        for _ in range(DB_READ_POOL_SIZE):
+            reader = await aiosqlite.connect(f"file:{self.db_path}?mode=ro", uri=True)
+            reader.row_factory = aiosqlite.Row
+            await self._apply_pragmas(reader)
+            self._readers.append(reader)
+            self._idle_readers.put_nowait(reader)
+        logger.info(f"Opened {len(self._readers)} read-only SQLite connections")
+
+    @asynccontextmanager
+    async def _reader(self) -> AsyncIterator[aiosqlite.Connection]:
+        """An idle read-only connection, or the writer if there is no read pool."""
+        if self._idle_readers is None:
+            yield self.connection
+            return
+
+        reader = await self._idle_readers.get()
+        try:
+            yield reader
+        finally:
+            self._idle_readers.put_nowait(reader)
+
+    async def _fetchall(self, sql: str, params: tuple = ()) -> list[aiosqlite.Row]:
+        async with self._reader() as conn:
+            cursor = await conn.execute(sql, params)
+            return await cursor.fetchall()
+
+    async def _fetchone(self, sql: str, params: tuple = ()) -> Optional[aiosqlite.Row]:
+        async with self._reader() as conn:
+            cursor = await conn.execute(sql, params)
+            return await cursor.fetchone()
+
+    async def _write(self, op: Callable[[aiosqlite.Connection], Awaitable[T]]) -> T:
+        """Run op on the writer and commit; with write batching, share the commit with concurrent writes."""
+        if self._write_queue is None:
+            result = await op(self.connection)
+            await self.connection.commit()
+            return result
+
+        # Nothing would ever commit the write and its caller would wait forever
+        if self._write_task.done():
+            raise RuntimeError("Database write task is not running")
+
+        future = asyncio.get_running_loop().create_future()
+        self._write_queue.put_nowait((op, future))
+        return await future
+
+    async def _execute(self, sql: str, params: tuple = ()) -> int:
+        """Run one write statement; returns the cursor's lastrowid."""
+        async def op(conn: aiosqlite.Connection) -> int:
+            cursor = await conn.execute(sql, params)
+            return cursor.lastrowid
+
+        return await self._write(op)
+
+    async def _executemany(self, sql: str, rows: list):
+        async def op(conn: aiosqlite.Connection):
+            await conn.executemany(sql, rows)
+
+        await self._write(op)
+
+    async def _flush_writes(self, queue: asyncio.Queue):
+        """Commit queued writes in one transaction every DB_WRITE_BATCH_DELAY seconds until a None arrives."""
+        stopping = False
+        batch = []
+        try:
+            while not stopping:
+                item = await queue.get()
+                if item is None:
+                    return
+                batch = [item]
+                await asyncio.sleep(DB_WRITE_BATCH_DELAY)
+                while len(batch) < DB_WRITE_BATCH_MAX and not queue.empty():
+                    item = queue.get_nowait()
+                    if item is None:
+                        stopping = True
+                        break
+                    batch.append(item)
+                try:
+                    await self._commit_batch(batch)
+                except Exception as e:
+                    # Keep the task alive: later writes must not queue up behind a dead flusher
+                    logger.error(f"Batched write of {len(batch)} operations failed: {e}")
+                    self._fail_writes(batch, e)
+        except asyncio.CancelledError:
+            # Nothing will commit the batch in flight or the writes still queued
+            error = RuntimeError("Database write task was cancelled")
+            self._fail_writes(batch, error)
+            while not queue.empty():
+                item = queue.get_nowait()
+                if item is not None:
+                    self._fail_writes([item], error)
+            raise
+
+    @staticmethod
+    def _fail_writes(batch: list[tuple], error: Exception):
+        for _, future in batch:
+            if not future.done():
+                future.set_exception(error)
+
+    async def _commit_batch(self, batch: list[tuple]):
+        conn = self.connection
+        outcomes = []
+        try:
+            await conn.execute("BEGIN")
+            for op, future in batch:
+                # The caller gave up (e.g. a cancelled lookup) before its write ran
+                if future.done():
+                    continue
+                # A savepoint per write keeps one failing statement from undoing the rest
+                await conn.execute("SAVEPOINT write")
+                try:
+                    outcomes.append((future, await op(conn), None))
+                except Exception as e:
+                    await conn.execute("ROLLBACK TO write")
+                    outcomes.append((future, None, e))
+                await conn.execute("RELEASE write")
+            await conn.commit()
+        except Exception as e:
+            logger.error(f"Batched write of {len(batch)} operations failed: {e}")
+            try:
+                await conn.rollback()
+            except Exception as rollback_error:
+                logger.error(f"Rolling back the failed batch failed: {rollback_error}")
+            outcomes = [(future, None, e) for _, future in batch]
+
+        for future, result, error in outcomes:
+            if future.done():
+                continue
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
     async def _create_tables(self):
         await self.connection.executescript("""
             CREATE TABLE IF NOT EXISTS users (
@@ -83,45 +310,177 @@ class Database:
                 FOREIGN KEY (user_id) REFERENCES users(telegram_id),
                 UNIQUE(user_id, tmdb_id)
             );
+
+            CREATE TABLE IF NOT EXISTS session_candidates (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                session_id INTEGER,
+                tmdb_id INTEGER,
+                title TEXT,
+                reason TEXT,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (session_id) REFERENCES recommendation_sessions(id),
+                UNIQUE(session_id, tmdb_id)
+            );
+
+            CREATE TABLE IF NOT EXISTS movie_neighbors (
+                tmdb_id INTEGER,
+                neighbor_id INTEGER,
+                score REAL,
+                PRIMARY KEY (tmdb_id, neighbor_id)
+            );
+
+            CREATE TABLE IF NOT EXISTS movie_cache (
+                tmdb_id INTEGER,
+                language TEXT,
+                details TEXT,
+                details_fetched_at TIMESTAMP,
+                trailer_url TEXT,
+                trailer_fetched_at TIMESTAMP,
+                PRIMARY KEY (tmdb_id, language)
+            );
+
+            CREATE TABLE IF NOT EXISTS candidate_pools (
+                bucket TEXT,
+                rank INTEGER,
+                tmdb_id INTEGER,
+                title TEXT,
+                reason TEXT,
+                genre_ids TEXT,
+                created_at TIMESTAMP,
+                PRIMARY KEY (bucket, tmdb_id)
+            );
+
+            CREATE TABLE IF NOT EXISTS ai_candidate_stats (
+                user_id INTEGER PRIMARY KEY,
+                suggested INTEGER DEFAULT 0,
+                wasted INTEGER DEFAULT 0,
+                FOREIGN KEY (user_id) REFERENCES users(telegram_id)
+            );
+
+            CREATE TABLE IF NOT EXISTS title_resolutions (
+                title_norm TEXT,
+                year INTEGER,
+                tmdb_id INTEGER,
+                resolved_at TIMESTAMP,
+                PRIMARY KEY (title_norm, year)
+            );
+
+            CREATE TABLE IF NOT EXISTS fsm_storage (
+                key TEXT PRIMARY KEY,
+                state TEXT,
+                data TEXT,
+                updated_at TIMESTAMP
+            );
+
+            CREATE INDEX IF NOT EXISTS idx_fsm_storage_updated ON fsm_storage(updated_at);
         """)
         await self.connection.commit()
+        await self._migrate()
+
+    async def _migrate(self):
+        cursor = await self.connection.execute("PRAGMA user_version")
+        version = (await cursor.fetchone())[0]
+        for number, script in enumerate(MIGRATIONS[version:], start=version + 1):
+            # user_version is transactional, so a failed migration leaves no trace
+            await self.connection.executescript(
+                f"BEGIN;\n{script}\nPRAGMA user_version = {number};\nCOMMIT;"
+            )
+            logger.info(f"Applied database migration {number}")
+
+    async def _create_catalog_tables(self):
+        # FTS5 is an optional SQLite extension; the bot works without the local catalog
+        try:
+            await self.connection.executescript("""
+                CREATE TABLE IF NOT EXISTS movie_titles (
+                    tmdb_id INTEGER PRIMARY KEY,
+                    title TEXT,
+                    title_norm TEXT,
+                    year INTEGER,
+                    popularity REAL
+                );
+
+                CREATE VIRTUAL TABLE IF NOT EXISTS movie_titles_fts USING fts5(
+                    title_norm, content='movie_titles', content_rowid='tmdb_id'
+                );
+
+                CREATE TRIGGER IF NOT EXISTS movie_titles_ai AFTER INSERT ON movie_titles BEGIN
+                    INSERT INTO movie_titles_fts (rowid, title_norm) VALUES (new.tmdb_id, new.title_norm);
+                END;
+
+                CREATE TRIGGER IF NOT EXISTS movie_titles_ad AFTER DELETE ON movie_titles BEGIN
+                    INSERT INTO movie_titles_fts (movie_titles_fts, rowid, title_norm)
+                    VALUES ('delete', old.tmdb_id, old.title_norm);
+                END;
+
+                CREATE TRIGGER IF NOT EXISTS movie_titles_au AFTER UPDATE OF title_norm ON movie_titles BEGIN
+                    INSERT INTO movie_titles_fts (movie_titles_fts, rowid, title_norm)
+                    VALUES ('delete', old.tmdb_id, old.title_norm);
+                    INSERT INTO movie_titles_fts (rowid, title_norm) VALUES (new.tmdb_id, new.title_norm);
+                END;
+            """)
+            await self.connection.commit()
+            self.catalog_available = True
+        except sqlite3.OperationalError as e:
+            logger.warning(f"Local title catalog disabled: {e}")
 
     # User operations
     async def get_user(self, telegram_id: int) -> Optional[dict]:
-        cursor = await self.connection.execute(
+        user = self.user_cache.get(telegram_id)
+        if user is not None:
+            return dict(user)
+
+        generation = self._user_generations.get(telegram_id, 0)
+        row = await self._fetchone(
             "SELECT * FROM users WHERE telegram_id = ?", (telegram_id,)
         )
-        row = await cursor.fetchone()
-        return dict(row) if row else None
+        if not row:
+            return None
+        # A write committed while the row was read may not be in it; leave the next read to cache
+        if self._user_generations.get(telegram_id, 0) == generation:
+            self.user_cache.set(telegram_id, dict(row))
+        return dict(row)
+
+    def _user_written(self, telegram_id: int):
+        self._user_generations[telegram_id] = self._user_generations.get(telegram_id, 0) + 1
+
+    def _invalidate_user(self, telegram_id: int):
+        self._user_written(telegram_id)
+        self.user_cache.pop(telegram_id)
+
+    def _update_cached_user(self, telegram_id: int, **fields):
+        self._user_written(telegram_id)
+        user = self.user_cache.get(telegram_id)
+        if user is not None:
+            self.user_cache.set(telegram_id, {**user, **fields})
 
     async def create_user(self, telegram_id: int, language: str = "uk") -> dict:
-        await self.connection.execute(
+        await self._execute(
             "INSERT OR IGNORE INTO users (telegram_id, language) VALUES (?, ?)",
             (telegram_id, language)
         )
-        await self.connection.commit()
+        # INSERT OR IGNORE may have kept an existing row, so re-read rather than guess
+        self._invalidate_user(telegram_id)
         return await self.get_user(telegram_id)
 
     async def update_user_language(self, telegram_id: int, language: str):
-        await self.connection.execute(
+        await self._execute(
             "UPDATE users SET language = ? WHERE telegram_id = ?",
             (language, telegram_id)
         )
-        await self.connection.commit()
+        self._update_cached_user(telegram_id, language=language)
 
     async def set_base_profile_completed(self, telegram_id: int, completed: bool = True):
-        await self.connection.execute(
+        await self._execute(
             "UPDATE users SET base_profile_completed = ? WHERE telegram_id = ?",
             (1 if completed else 0, telegram_id)
         )
-        await self.connection.commit()
+        self._update_cached_user(telegram_id, base_profile_completed=1 if completed else 0)
 
     # Base profile operations
     async def get_base_profile(self, user_id: int) -> Optional[dict]:
-        cursor = await self.connection.execute(
+        row = await self._fetchone(
             "SELECT * FROM base_profiles WHERE user_id = ?", (user_id,)
         )
-        row = await cursor.fetchone()
         return dict(row) if row else None
 
     async def save_base_profile(self, user_id: int, profile_data: dict):
@@ -140,110 +499,441 @@ class Database:
         field_names = "user_id, " + ", ".join(fields)
         update_clause = ", ".join([f"{f} = excluded.{f}" for f in fields])
 
-        await self.connection.execute(
+        await self._execute(
             f"""INSERT INTO base_profiles ({field_names}) VALUES ({placeholders})
                 ON CONFLICT(user_id) DO UPDATE SET {update_clause}""",
             values
         )
-        await self.connection.commit()
 
     # Recommendation session operations
     async def create_session(self, user_id: int, dynamic_answers: dict) -> int:
-        cursor = await self.connection.execute(
+        return await self._execute(
             "INSERT INTO recommendation_sessions (user_id, dynamic_answers) VALUES (?, ?)",
             (user_id, json.dumps(dynamic_answers, ensure_ascii=False))
         )
-        await self.connection.commit()
-        return cursor.lastrowid
 
     async def get_session(self, session_id: int) -> Optional[dict]:
-        cursor = await self.connection.execute(
+        row = await self._fetchone(
             "SELECT * FROM recommendation_sessions WHERE id = ?", (session_id,)
         )
-        row = await cursor.fetchone()
         if row:
             result = dict(row)
             result["dynamic_answers"] = json.loads(result["dynamic_answers"])
             return result
         return None
 
-    # Recommendation operations
-    async def add_recommendation(self, session_id: int, tmdb_id: int, title: str) -> int:
-        cursor = await self.connection.execute(
-            "INSERT INTO recommendations (session_id, tmdb_id, title) VALUES (?, ?, ?)",
-            (session_id, tmdb_id, title)
+    # Session candidate queue operations
+    async def add_session_candidates(self, session_id: int, candidates: list[dict]):
+        await self._executemany(
+            """INSERT OR IGNORE INTO session_candidates (session_id, tmdb_id, title, reason)
+               VALUES (?, ?, ?, ?)""",
+            [(session_id, c["tmdb_id"], c["title"], c.get("reason", "")) for c in candidates]
+        )
+
+    async def pop_session_candidate(self, session_id: int) -> Optional[dict]:
+        # Select and delete in one statement so concurrent "Next" clicks never get the same row
+        async def pop(conn: aiosqlite.Connection) -> list[aiosqlite.Row]:
+            cursor = await conn.execute(
+                """DELETE FROM session_candidates WHERE id = (
+                       SELECT id FROM session_candidates WHERE session_id = ? ORDER BY id LIMIT 1
+                   ) RETURNING tmdb_id, title, reason""",
+                (session_id,)
+            )
+            return await cursor.fetchall()
+
+        rows = await self._write(pop)
+        return dict(rows[0]) if rows else None
+
+    async def get_session_candidate_ids(self, session_id: int) -> list[int]:
+        rows = await self._fetchall(
+            "SELECT tmdb_id FROM session_candidates WHERE session_id = ? ORDER BY id",
+            (session_id,)
+        )
+        return [row[0] for row in rows]
+
+    async def clear_user_session_candidates(self, user_id: int):
+        await self._execute(
+            """DELETE FROM session_candidates WHERE session_id IN (
+                   SELECT id FROM recommendation_sessions WHERE user_id = ?
+               )""",
+            (user_id,)
         )
-        await self.connection.commit()
-        return cursor.lastrowid
+
+    # Recommendation operations
+    async def add_recommendation(self, session_id: int, tmdb_id: int, title: str) -> Optional[int]:
+        """Record a shown movie; returns None if the session does not exist."""
+        async def op(conn: aiosqlite.Connection) -> Optional[int]:
+            cursor = await conn.execute(
+                """INSERT INTO recommendations (session_id, user_id, tmdb_id, title)
+                   SELECT ?, user_id, ?, ? FROM recommendation_sessions WHERE id = ?""",
+                (session_id, tmdb_id, title, session_id)
+            )
+            # lastrowid is left over from an earlier insert when the SELECT matched no session
+            return cursor.lastrowid if cursor.rowcount > 0 else None
+
+        rec_id = await self._write(op)
+        if rec_id is None:
+            logger.warning(f"Recommendation of {tmdb_id} not recorded: session {session_id} does not exist")
+        return rec_id
 
     async def update_recommendation_action(self, rec_id: int, action: str):
-        await self.connection.execute(
+        await self._execute(
             "UPDATE recommendations SET action = ? WHERE id = ?",
             (action, rec_id)
         )
-        await self.connection.commit()
 
     async def get_shown_movie_ids(self, user_id: int, limit: int = 100) -> list[int]:
-        cursor = await self.connection.execute(
-            """SELECT DISTINCT r.tmdb_id FROM recommendations r
-               JOIN recommendation_sessions s ON r.session_id = s.id
-               WHERE s.user_id = ? ORDER BY r.shown_at DESC LIMIT ?""",
+        rows = await self._fetchall(
+            """SELECT tmdb_id FROM recommendations WHERE user_id = ?
+               GROUP BY tmdb_id ORDER BY MAX(shown_at) DESC LIMIT ?""",
             (user_id, limit)
         )
-        rows = await cursor.fetchall()
         return [row[0] for row in rows]
 
+    async def get_recent_excluded_titles(self, user_id: int, limit: int = 50) -> list[str]:
+        """
+        Titles of the movies most recently shown to or watched by the user, newest first.
+        Stored titles are localized, so cached English (or else original) titles are preferred,
+        matching the titles the AI is asked to write.
+        """
+        rows = await self._fetchall(
+            """SELECT COALESCE(
+                   (SELECT json_extract(details, '$.title') FROM movie_cache
+                    WHERE tmdb_id = seen.tmdb_id AND language = 'en-US' AND details IS NOT NULL),
+                   (SELECT json_extract(details, '$.original_title') FROM movie_cache
+                    WHERE tmdb_id = seen.tmdb_id AND details IS NOT NULL LIMIT 1),
+                   seen.title
+               ) FROM (
+                   SELECT tmdb_id, MAX(title) AS title, MAX(seen_at) AS seen_at FROM (
+                       SELECT tmdb_id, title, shown_at AS seen_at FROM recommendations WHERE user_id = ?
+                       UNION ALL
+                       SELECT tmdb_id, title, added_at FROM watched_movies WHERE user_id = ?
+                   ) WHERE title IS NOT NULL
+                   GROUP BY tmdb_id ORDER BY MAX(seen_at) DESC LIMIT ?
+               ) AS seen ORDER BY seen.seen_at DESC""",
+            (user_id, user_id, limit)
+        )
+        return [row[0] for row in rows]
+
+    # AI candidate outcome operations
+    async def record_ai_candidates(self, user_id: int, suggested: int, wasted: int):
+        """Count AI suggestions for the user and how many were unusable (already seen or not found)."""
+        await self._execute(
+            """INSERT INTO ai_candidate_stats (user_id, suggested, wasted) VALUES (?, ?, ?)
+               ON CONFLICT(user_id) DO UPDATE SET
+                   suggested = suggested + excluded.suggested,
+                   wasted = wasted + excluded.wasted""",
+            (user_id, suggested, wasted)
+        )
+
+    async def get_ai_candidate_stats(self, user_id: Optional[int] = None) -> tuple[int, int]:
+        """(suggested, wasted) totals for one user, or for all users if user_id is None."""
+        if user_id is None:
+            row = await self._fetchone(
+                "SELECT COALESCE(SUM(suggested), 0), COALESCE(SUM(wasted), 0) FROM ai_candidate_stats"
+            )
+        else:
+            row = await self._fetchone(
+                "SELECT suggested, wasted FROM ai_candidate_stats WHERE user_id = ?", (user_id,)
+            )
+        return (row[0], row[1]) if row else (0, 0)
+
     # Saved movies operations
     async def save_movie(self, user_id: int, tmdb_id: int, title: str, poster_url: str):
-        await self.connection.execute(
+        await self._execute(
             """INSERT OR REPLACE INTO saved_movies (user_id, tmdb_id, title, poster_url, added_at)
                VALUES (?, ?, ?, ?, ?)""",
             (user_id, tmdb_id, title, poster_url, datetime.now())
         )
-        await self.connection.commit()
 
     async def get_saved_movies(self, user_id: int) -> list[dict]:
-        cursor = await self.connection.execute(
+        rows = await self._fetchall(
             "SELECT * FROM saved_movies WHERE user_id = ? ORDER BY added_at DESC",
             (user_id,)
         )
-        rows = await cursor.fetchall()
         return [dict(row) for row in rows]
 
     async def delete_saved_movie(self, user_id: int, tmdb_id: int):
-        await self.connection.execute(
+        await self._execute(
             "DELETE FROM saved_movies WHERE user_id = ? AND tmdb_id = ?",
             (user_id, tmdb_id)
         )
-        await self.connection.commit()
 
     async def is_movie_saved(self, user_id: int, tmdb_id: int) -> bool:
-        cursor = await self.connection.execute(
+        row = await self._fetchone(
             "SELECT 1 FROM saved_movies WHERE user_id = ? AND tmdb_id = ?",
             (user_id, tmdb_id)
         )
-        return await cursor.fetchone() is not None
+        return row is not None
 
     # Watched movies operations
     async def mark_as_watched(self, user_id: int, tmdb_id: int, title: str):
-        await self.connection.execute(
+        await self._execute(
             """INSERT OR IGNORE INTO watched_movies (user_id, tmdb_id, title)
                VALUES (?, ?, ?)""",
             (user_id, tmdb_id, title)
         )
-        await self.connection.commit()
 
     async def get_watched_movie_ids(self, user_id: int) -> list[int]:
-        cursor = await self.connection.execute(
+        rows = await self._fetchall(
             "SELECT tmdb_id FROM watched_movies WHERE user_id = ?",
             (user_id,)
         )
-        rows = await cursor.fetchall()
         return [row[0] for row in rows]
 
     async def is_movie_watched(self, user_id: int, tmdb_id: int) -> bool:
-        cursor = await self.connection.execute(
+        row = await self._fetchone(
             "SELECT 1 FROM watched_movies WHERE user_id = ? AND tmdb_id = ?",
             (user_id, tmdb_id)
         )
-        return await cursor.fetchone() is not None
+        return row is not None
+
+    # Movie metadata cache operations
+    async def get_cached_movie(self, tmdb_id: int, language: str) -> Optional[dict]:
+        row = await self._fetchone(
+            "SELECT * FROM movie_cache WHERE tmdb_id = ? AND language = ?",
+            (tmdb_id, language)
+        )
+        if not row:
+            return None
+
+        result = dict(row)
+        result["details"] = json.loads(result["details"]) if result["details"] else None
+        for field in ("details_fetched_at", "trailer_fetched_at"):
+            if result[field]:
+                result[field] = datetime.fromisoformat(result[field])
+        return result
+
+    async def get_cached_movie_details_since(self, since: Optional[datetime] = None) -> list[dict]:
+        """Cached movie dicts fetched after `since` (all of them if None), oldest first."""
+        rows = await self._fetchall(
+            """SELECT tmdb_id, language, details, details_fetched_at FROM movie_cache
+               WHERE details IS NOT NULL AND details_fetched_at > ?
+               ORDER BY details_fetched_at""",
+            (since.isoformat(" ") if since else "",)
+        )
+        return [
+            {
+                "tmdb_id": row["tmdb_id"],
+                "language": row["language"],
+                "details": json.loads(row["details"]),
+                "details_fetched_at": datetime.fromisoformat(row["details_fetched_at"]),
+            }
+            for row in rows
+        ]
+
+    async def cache_movie_details(self, tmdb_id: int, language: str, details: dict):
+        await self._execute(
+            """INSERT INTO movie_cache (tmdb_id, language, details, details_fetched_at)
+               VALUES (?, ?, ?, ?)
+               ON CONFLICT(tmdb_id, language) DO UPDATE SET
+                   details = excluded.details,
+                   details_fetched_at = excluded.details_fetched_at""",
+            (tmdb_id, language, json.dumps(details, ensure_ascii=False), datetime.now().isoformat(" "))
+        )
+
+    async def cache_movie_trailer(self, tmdb_id: int, language: str, trailer_url: Optional[str]):
+        await self._execute(
+            """INSERT INTO movie_cache (tmdb_id, language, trailer_url, trailer_fetched_at)
+               VALUES (?, ?, ?, ?)
+               ON CONFLICT(tmdb_id, language) DO UPDATE SET
+                   trailer_url = excluded.trailer_url,
+                   trailer_fetched_at = excluded.trailer_fetched_at""",
+            (tmdb_id, language, trailer_url, datetime.now().isoformat(" "))
+        )
+
+    # AI title resolution memo operations
+    async def get_title_resolution(self, title_norm: str, year: int) -> Optional[dict]:
+        """Memoized resolution of a normalized AI title; tmdb_id is None for "not found"."""
+        row = await self._fetchone(
+            "SELECT tmdb_id, resolved_at FROM title_resolutions WHERE title_norm = ? AND year = ?",
+            (title_norm, year)
+        )
+        if not row:
+            return None
+        return {"tmdb_id": row["tmdb_id"], "resolved_at": datetime.fromisoformat(row["resolved_at"])}
+
+    async def save_title_resolution(self, title_norm: str, year: int, tmdb_id: Optional[int]):
+        await self._execute(
+            """INSERT INTO title_resolutions (title_norm, year, tmdb_id, resolved_at)
+               VALUES (?, ?, ?, ?)
+               ON CONFLICT(title_norm, year) DO UPDATE SET
+                   tmdb_id = excluded.tmdb_id,
+                   resolved_at = excluded.resolved_at""",
+            (title_norm, year, tmdb_id, datetime.now().isoformat(" "))
+        )
+
+    # Precomputed candidate pool operations
+    async def get_recent_session_contexts(self, days: int) -> list[dict]:
+        """Survey answers, liked genres and language of every session in the last `days` days."""
+        rows = await self._fetchall(
+            """SELECT s.dynamic_answers, b.genres_like, u.language
+               FROM recommendation_sessions s
+               LEFT JOIN base_profiles b ON b.user_id = s.user_id
+               LEFT JOIN users u ON u.telegram_id = s.user_id
+               WHERE s.created_at >= datetime('now', ?)""",
+            (f"-{days} days",)
+        )
+        return [
+            {
+                "dynamic_answers": json.loads(row["dynamic_answers"]) if row["dynamic_answers"] else {},
+                "genres_like": json.loads(row["genres_like"]) if row["genres_like"] else [],
+                "language": row["language"] or "uk",
+            }
+            for row in rows
+        ]
+
+    async def replace_candidate_pool(self, bucket: str, candidates: list[dict]):
+        """Store a ranked pool of {"tmdb_id", "title", "reason", "genre_ids"} for a bucket."""
+        now = datetime.now().isoformat(" ")
+
+        async def replace(conn: aiosqlite.Connection):
+            await conn.execute("DELETE FROM candidate_pools WHERE bucket = ?", (bucket,))
+            await conn.executemany(
+                """INSERT OR IGNORE INTO candidate_pools
+                   (bucket, rank, tmdb_id, title, reason, genre_ids, created_at)
+                   VALUES (?, ?, ?, ?, ?, ?, ?)""",
+                [
+                    (bucket, rank, c["tmdb_id"], c["title"], c["reason"], json.dumps(c["genre_ids"]), now)
+                    for rank, c in enumerate(candidates)
+                ]
+            )
+
+        await self._write(replace)
+
+    async def get_candidate_pool(self, bucket: str) -> tuple[list[dict], Optional[datetime]]:
+        """Ranked pool of a bucket and when it was built (None if there is none)."""
+        rows = await self._fetchall(
+            """SELECT tmdb_id, title, reason, genre_ids, created_at FROM candidate_pools
+               WHERE bucket = ? ORDER BY rank""",
+            (bucket,)
+        )
+        if not rows:
+            return [], None
+
+        pool = [
+            {
+                "tmdb_id": row["tmdb_id"],
+                "title": row["title"],
+                "reason": row["reason"],
+                "genre_ids": json.loads(row["genre_ids"]),
+            }
+            for row in rows
+        ]
+        return pool, datetime.fromisoformat(rows[0]["created_at"])
+
+    async def get_candidate_pool_times(self) -> dict[str, datetime]:
+        rows = await self._fetchall(
+            "SELECT bucket, MAX(created_at) FROM candidate_pools GROUP BY bucket"
+        )
+        return {row[0]: datetime.fromisoformat(row[1]) for row in rows}
+
+    # Collaborative filtering operations
+    async def get_interactions(self) -> list[tuple[int, int, float]]:
+        """Implicit feedback of all users as (user_id, tmdb_id, weight) rows."""
+        rows = await self._fetchall(
+            """SELECT user_id, tmdb_id, SUM(weight) FROM (
+                   SELECT user_id, tmdb_id, 3.0 AS weight FROM saved_movies
+                   UNION ALL
+                   SELECT user_id, tmdb_id, 2.0 AS weight FROM watched_movies
+                   UNION ALL
+                   SELECT user_id, tmdb_id,
+                          CASE action WHEN 'saved' THEN 3.0 WHEN 'watched' THEN 2.0 ELSE 1.0 END
+                   FROM recommendations WHERE action != 'shown'
+               ) GROUP BY user_id, tmdb_id"""
+        )
+        return [(row[0], row[1], row[2]) for row in rows]
+
+    async def replace_movie_neighbors(self, neighbors: list[tuple[int, int, float]]):
+        """Swap in a freshly computed neighbour list in one transaction."""
+        async def replace(conn: aiosqlite.Connection):
+            await conn.execute("DELETE FROM movie_neighbors")
+            await conn.executemany(
+                "INSERT INTO movie_neighbors (tmdb_id, neighbor_id, score) VALUES (?, ?, ?)",
+                neighbors
+            )
+
+        await self._write(replace)
+
+    async def get_movie_neighbors(self, tmdb_ids: list[int], limit: int = 20) -> list[tuple[int, float]]:
+        """Movies most similar to the given ones, as (tmdb_id, summed score), best first."""
+        if not tmdb_ids:
+            return []
+
+        placeholders = ", ".join(["?"] * len(tmdb_ids))
+        rows = await self._fetchall(
+            f"""SELECT neighbor_id, SUM(score) AS total FROM movie_neighbors
+                WHERE tmdb_id IN ({placeholders}) AND neighbor_id NOT IN ({placeholders})
+                GROUP BY neighbor_id ORDER BY total DESC LIMIT ?""",
+            (*tmdb_ids, *tmdb_ids, limit)
+        )
+        return [(row[0], row[1]) for row in rows]
+
+    # FSM storage operations
+    async def get_fsm_record(self, key: str) -> Optional[dict]:
+        row = await self._fetchone(
+            "SELECT state, data, updated_at FROM fsm_storage WHERE key = ?", (key,)
+        )
+        if not row:
+            return None
+        return {
+            "state": row["state"],
+            "data": json.loads(row["data"]) if row["data"] else {},
+            "updated_at": datetime.fromisoformat(row["updated_at"]),
+        }
+
+    async def save_fsm_records(self, records: list[tuple]):
+        """Write (key, state, data, updated_at) rows in one transaction; an empty state and data deletes the key."""
+        async def save(conn: aiosqlite.Connection):
+            await conn.executemany(
+                "DELETE FROM fsm_storage WHERE key = ?",
+                [(key,) for key, state, data, _ in records if state is None and not data]
+            )
+            await conn.executemany(
+                """INSERT INTO fsm_storage (key, state, data, updated_at) VALUES (?, ?, ?, ?)
+                   ON CONFLICT(key) DO UPDATE SET
+                       state = excluded.state,
+                       data = excluded.data,
+                       updated_at = excluded.updated_at""",
+                [
+                    (key, state, json.dumps(data, ensure_ascii=False), updated_at.isoformat(" "))
+                    for key, state, data, updated_at in records
+                    if state is not None or data
+                ]
+            )
+
+        await self._write(save)
+
+    async def delete_fsm_records_before(self, updated_before: datetime) -> int:
+        """Drop FSM records last written before `updated_before`; returns how many."""
+        async def delete(conn: aiosqlite.Connection) -> int:
+            cursor = await conn.execute(
+                "DELETE FROM fsm_storage WHERE updated_at < ?", (updated_before.isoformat(" "),)
+            )
+            return cursor.rowcount
+
+        return await self._write(delete)
+
+    # Title catalog operations
+    async def upsert_catalog_titles(self, titles: list[tuple]):
+        """Insert or refresh (tmdb_id, title, title_norm, year, popularity) rows; a NULL year keeps the known one."""
+        await self._executemany(
+            """INSERT INTO movie_titles (tmdb_id, title, title_norm, year, popularity)
+               VALUES (?, ?, ?, ?, ?)
+               ON CONFLICT(tmdb_id) DO UPDATE SET
+                   title = excluded.title,
+                   title_norm = excluded.title_norm,
+                   year = COALESCE(excluded.year, movie_titles.year),
+                   popularity = COALESCE(excluded.popularity, movie_titles.popularity)""",
+            titles
+        )
+
+    async def search_catalog(self, match_query: str, limit: int = 20) -> list[dict]:
+        """Full-text search of normalized titles; `match_query` uses FTS5 syntax."""
+        rows = await self._fetchall(
+            """SELECT t.tmdb_id, t.title, t.title_norm, t.year, t.popularity
+               FROM movie_titles_fts JOIN movie_titles t ON t.tmdb_id = movie_titles_fts.rowid
+               WHERE movie_titles_fts MATCH ? ORDER BY bm25(movie_titles_fts) LIMIT ?""",
+            (match_query, limit)
+        )
+        return [dict(row) for row in rows]
@@ -0,0 +1,155 @@
+import asyncio
+import json
+import logging
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, StateType, StorageKey
+
+from config import FSM_STATE_TTL, FSM_FLUSH_INTERVAL, FSM_PRUNE_INTERVAL, FSM_CACHE_MAXSIZE
+from utils.cache import TTLCache
+from .db import Database
+
+logger = logging.getLogger(__name__)
+
+
+class SQLiteStorage(BaseStorage):
+    """
+    aiogram FSM storage kept in the bot's SQLite database, so surveys survive restarts.
+
+    Reads are served from a small LRU of recent keys; changes are buffered and written
+    in one transaction every FSM_FLUSH_INTERVAL seconds, so a burst of set_state and
+    update_data calls for one click costs a single row write. States idle longer than
+    FSM_STATE_TTL read as empty and are periodically deleted.
+    """
+
+    def __init__(
+        self,
+        db: Database,
+        ttl: float = FSM_STATE_TTL,
+        flush_interval: float = FSM_FLUSH_INTERVAL,
+        cache_size: int = FSM_CACHE_MAXSIZE
+    ):
+        self.db = db
+        self.ttl = ttl
+        self.flush_interval = flush_interval
+        # key -> (state, data) of recently used keys, and of keys changed since the last flush
+        self._cache = TTLCache(cache_size, ttl)
+        self._dirty: dict[str, tuple[Optional[str], dict, datetime]] = {}
+        self._flush_task: Optional[asyncio.Task] = None
+        self._last_prune = time.monotonic()
+        self._closed = False
+
+    @staticmethod
+    def _key(key: StorageKey) -> str:
+        return f"{key.bot_id}:{key.chat_id}:{key.user_id}:{key.thread_id or ''}:{key.destiny}"
+
+    async def _load(self, key: str) -> tuple[Optional[str], dict]:
+        if key in self._dirty:
+            state, data, _ = self._dirty[key]
+            return state, data
+
+        record = self._cache.get(key)
+        if record is not None:
+            return record
+
+        row = await self.db.get_fsm_record(key)
+        # A set_state/set_data that ran while the row was read is newer than the row
+        if key in self._dirty:
+            state, data, _ = self._dirty[key]
+            return state, data
+        record = self._cache.get(key)
+        if record is not None:
+            return record
+
+        remaining = self.ttl
+        if row is not None:
+            remaining -= (datetime.now() - row["updated_at"]).total_seconds()
+        if row is None or remaining <= 0:
+            record = (None, {})
+            remaining = self.ttl
+        else:
+            record = (row["state"], row["data"])
+        self._cache.set(key, record, ttl=remaining)
+        return record
+
+    async def _store(self, key: str, state: Optional[str], data: dict):
+        self._cache.set(key, (state, data))
+        self._dirty[key] = (state, data, datetime.now())
+        if self._closed:
+            # No flush loop runs after close(): write through
+            await self.flush()
+        elif self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush_loop(), name="fsm-storage")
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        key = self._key(key)
+        _, data = await self._load(key)
+        await self._store(key, state.state if isinstance(state, State) else state, data)
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        state, _ = await self._load(self._key(key))
+        return state
+
+    async def set_data(self, key: StorageKey, data: Dict[str, Any]) -> None:
+        key = self._key(key)
+        state, _ = await self._load(key)
+        # Round-trip through JSON: a private copy that reads back the same after a restart
+        await self._store(key, state, json.loads(json.dumps(data, ensure_ascii=False)))
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        _, data = await self._load(self._key(key))
+        return json.loads(json.dumps(data, ensure_ascii=False))
+
+    async def flush(self):
+        """Write buffered changes; on failure they stay buffered for the next attempt."""
+        if not self._dirty:
+            return
+
+        pending, self._dirty = self._dirty, {}
+        try:
+            await self.db.save_fsm_records(
+                [(key, state, data, updated_at) for key, (state, data, updated_at) in pending.items()]
+            )
+        except asyncio.CancelledError:
+            self._requeue(pending)
+            raise
+        except Exception as e:
+            logger.error(f"Failed to write {len(pending)} FSM records: {e}")
+            self._requeue(pending)
+
+    def _requeue(self, pending: dict):
+        # Changes made since the failed flush are newer, keep those
+        for key, record in pending.items():
+            self._dirty.setdefault(key, record)
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+            if time.monotonic() - self._last_prune >= FSM_PRUNE_INTERVAL:
+                self._last_prune = time.monotonic()
+                try:
+                    pruned = await self.db.delete_fsm_records_before(
+                        datetime.now() - timedelta(seconds=self.ttl)
+                    )
+                    if pruned:
+                        logger.info(f"Pruned {pruned} stale FSM records")
+                except Exception as e:
+                    logger.error(f"Failed to prune FSM records: {e}")
+
+    async def close(self) -> None:
+        if self._closed:
+            return
+        self._closed = True
+        if self._flush_task:
+            self._flush_task.cancel()
+            try:
+                await self._flush_task
+            except asyncio.CancelledError:
+                pass
+            self._flush_task = None
+        await self.flush()
@@ -6,6 +6,7 @@ from aiogram.fsm.state import State, StatesGroup
 from database import Database
 from locales import get_text
 from keyboards import get_single_select_keyboard, get_skip_keyboard
+from services import TMDBService, AIService
 
 router = Router()
 
@@ -159,23 +160,41 @@ async def process_seen_preference(callback: CallbackQuery, state: FSMContext):
 
 # Step 6: Specific request (text or skip)
 @router.callback_query(DynamicSurveyStates.specific_request, F.data == "dyn_specific:skip")
-async def skip_specific_request(callback: CallbackQuery, state: FSMContext, db: Database):
+async def skip_specific_request(
+    callback: CallbackQuery,
+    state: FSMContext,
+    db: Database,
+    tmdb: TMDBService,
+    ai: AIService
+):
     await state.update_data(specific_request="")
-    await _finish_dynamic_survey(callback, state, db)
+    await _finish_dynamic_survey(callback, state, db, tmdb, ai)
 
 
 @router.message(DynamicSurveyStates.specific_request)
-async def process_specific_request(message: Message, state: FSMContext, db: Database):
+async def process_specific_request(
+    message: Message,
+    state: FSMContext,
+    db: Database,
+    tmdb: TMDBService,
+    ai: AIService
+):
     text = message.text.lower()
     if text in ["ні", "no", "немає", "none"]:
         await state.update_data(specific_request="")
     else:
         await state.update_data(specific_request=message.text)
 
-    await _finish_dynamic_survey(message, state, db)
+    await _finish_dynamic_survey(message, state, db, tmdb, ai)
 
 
-async def _finish_dynamic_survey(source, state: FSMContext, db: Database):
+async def _finish_dynamic_survey(
+    source,
+    state: FSMContext,
+    db: Database,
+    tmdb: TMDBService,
+    ai: AIService
+):
     """Finish dynamic survey and start recommendation generation."""
     data = await state.get_data()
     lang = data.get("lang", "uk")
@@ -198,6 +217,13 @@ async def _finish_dynamic_survey(source, state: FSMContext, db: Database):
         "specific_request": data.get("specific_request", ""),
     }
 
+    # Import here to avoid circular imports
+    from .recommendation import generate_and_show_recommendation, cancel_prefetch
+
+    # Drop work prepared for the user's previous sessions
+    cancel_prefetch(user_id)
+    await db.clear_user_session_candidates(user_id)
+
     # Create session in DB
     session_id = await db.create_session(user_id, dynamic_answers)
 
@@ -205,9 +231,6 @@ async def _finish_dynamic_survey(source, state: FSMContext, db: Database):
     await state.update_data(session_id=session_id, dynamic_answers=dynamic_answers)
     await state.clear()
 
-    # Import here to avoid circular imports
-    from .recommendation import generate_and_show_recommendation
-
     # Show loading message
     if isinstance(source, CallbackQuery):
         await source.message.edit_text(get_text("searching_movie", lang))
@@ -219,6 +242,8 @@ async def _finish_dynamic_survey(source, state: FSMContext, db: Database):
     await generate_and_show_recommendation(
         message if isinstance(source, Message) else source.message,
         db,
+        tmdb,
+        ai,
         user_id,
         session_id,
         dynamic_answers,
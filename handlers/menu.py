@@ -1,3 +1,4 @@
+from typing import Optional
 from aiogram import Router, F
 from aiogram.types import CallbackQuery
 from aiogram.fsm.context import FSMContext
@@ -12,32 +13,30 @@ router = Router()
 
 
 @router.callback_query(F.data == "menu:find_movie")
-async def find_movie(callback: CallbackQuery, state: FSMContext, db: Database):
+async def find_movie(callback: CallbackQuery, state: FSMContext, user: Optional[dict]):
     """Start finding a movie - begin dynamic survey."""
-    user = await db.get_user(callback.from_user.id)
     lang = user["language"] if user else "uk"
 
     await start_dynamic_survey(callback, state, lang)
 
 
 @router.callback_query(F.data == "menu:profile")
-async def show_profile(callback: CallbackQuery, db: Database):
+async def show_profile(callback: CallbackQuery, db: Database, user: Optional[dict]):
     """Show user profile."""
     from .profile import show_user_profile
-    await show_user_profile(callback, db)
+    await show_user_profile(callback, db, user["language"] if user else "uk")
 
 
 @router.callback_query(F.data == "menu:saved")
-async def show_saved(callback: CallbackQuery, db: Database):
+async def show_saved(callback: CallbackQuery, db: Database, user: Optional[dict]):
     """Show saved movies."""
     from .saved import show_saved_movies
-    await show_saved_movies(callback, db)
+    await show_saved_movies(callback, db, user["language"] if user else "uk")
 
 
 @router.callback_query(F.data == "menu:update_profile")
-async def update_profile(callback: CallbackQuery, state: FSMContext, db: Database):
+async def update_profile(callback: CallbackQuery, state: FSMContext, user: Optional[dict]):
     """Start profile update - re-run base survey."""
-    user = await db.get_user(callback.from_user.id)
     lang = user["language"] if user else "uk"
 
     await state.set_state(BaseSurveyStates.emotions_like)
@@ -59,9 +58,8 @@ async def change_language(callback: CallbackQuery):
 
 
 @router.callback_query(F.data == "menu:back")
-async def back_to_menu(callback: CallbackQuery, db: Database):
+async def back_to_menu(callback: CallbackQuery, user: Optional[dict]):
     """Return to main menu."""
-    user = await db.get_user(callback.from_user.id)
     lang = user["language"] if user else "uk"
 
     await callback.message.edit_text(
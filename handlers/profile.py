@@ -9,11 +9,8 @@ from utils.helpers import parse_list_from_json
 router = Router()
 
 
-async def show_user_profile(callback: CallbackQuery, db: Database):
+async def show_user_profile(callback: CallbackQuery, db: Database, lang: str):
     """Display user's profile information."""
-    user = await db.get_user(callback.from_user.id)
-    lang = user["language"] if user else "uk"
-
     profile = await db.get_base_profile(callback.from_user.id)
 
     if not profile:
@@ -1,34 +1,787 @@
+import asyncio
 import logging
+import math
+from typing import AsyncIterator, Awaitable, Callable, Optional
 from aiogram import Router, F
 from aiogram.types import Message, CallbackQuery
 
 from database import Database
 from locales import get_text
 from keyboards import get_recommendation_keyboard, get_main_menu_keyboard
-from services import TMDBService, AIService
-from services.tmdb import TMDB_GENRE_IDS
+from services import TMDBService, AIService, LocalRecommender
+from services.similarity import similarity_index
+from services.recommendation_cache import context_key, recommendation_cache
+from services.pools import get_pool
+from config import (
+    CANDIDATE_QUEUE_LOW_WATERMARK,
+    RECOMMENDATION_MODE,
+    AI_EXCLUDED_TITLES,
+    AI_CANDIDATES,
+    AI_MAX_CANDIDATES,
+    REC_SOFT_DEADLINE,
+    REC_HARD_DEADLINE,
+)
 from utils.helpers import format_movie_card, parse_list_from_json
+from utils.background import spawn
 
 router = Router()
 logger = logging.getLogger(__name__)
 
-tmdb_service = TMDBService()
-ai_service = AIService()
+# Sessions whose candidate queue is currently being refilled from the AI
+_refilling_sessions: set[int] = set()
 
+# Sessions with user-facing AI calls in progress -> how many; background refills skip them
+_foreground_ai_calls: dict[int, int] = {}
 
-def get_genre_ids_from_profile(genres: list[str]) -> list[int]:
-    """Convert genre names to TMDB genre IDs."""
-    ids = []
-    for genre in genres:
-        genre_key = genre.lower()
-        if genre_key in TMDB_GENRE_IDS:
-            ids.append(TMDB_GENRE_IDS[genre_key])
-    return ids
+# Next card prepared in the background, per user: {"session_id", "task", "card"}
+_prefetches: dict[int, dict] = {}
+
+
+async def resolve_ai_candidate(
+    tmdb: TMDBService,
+    rec: dict,
+    excluded_ids: set[int],
+    tmdb_language: str
+) -> Optional[tuple[dict, Optional[str]]]:
+    """Resolve one AI suggestion to (movie_data, trailer_url), or None if unknown or excluded."""
+    resolved = await tmdb.resolve_title(rec.get("title", ""), rec.get("year"), excluded_ids, tmdb_language)
+    if resolved:
+        resolved[0]["ai_reason"] = rec.get("reason", "")
+    return resolved
+
+
+async def resolve_candidate_stream(
+    tmdb: TMDBService,
+    recommendations: AsyncIterator[dict],
+    excluded_ids: set[int],
+    tmdb_language: str,
+    cache_key: Optional[str] = None,
+    on_done: Optional[Callable[[int, int], None]] = None
+) -> AsyncIterator[Optional[tuple[dict, Optional[str]]]]:
+    """
+    Start resolving each AI suggestion as soon as it arrives, concurrently,
+    and yield the results (None for unusable ones) in rank order.
+    Valid results are also shared with other users under `cache_key`;
+    `on_done(suggested, wasted)` gets the counts of results that were awaited.
+    """
+    tasks: list[asyncio.Task] = []
+    wasted = 0
+    arrived = asyncio.Event()
+
+    async def produce():
+        try:
+            async for rec in recommendations:
+                tasks.append(asyncio.create_task(resolve_ai_candidate(tmdb, rec, excluded_ids, tmdb_language)))
+                arrived.set()
+        finally:
+            arrived.set()
+
+    producer = asyncio.create_task(produce())
+    index = 0
+    try:
+        while True:
+            if index < len(tasks):
+                task = tasks[index]
+                index += 1
+                try:
+                    result = await task
+                except Exception as e:
+                    logger.warning(f"Failed to resolve AI candidate: {e}")
+                    result = None
+                if result:
+                    recommendation_cache.add(cache_key, [queued_candidate(result[0])])
+                else:
+                    wasted += 1
+                yield result
+            elif producer.done():
+                if not producer.cancelled() and producer.exception():
+                    logger.warning(f"AI suggestion stream failed: {producer.exception()}")
+                return
+            else:
+                arrived.clear()
+                await arrived.wait()
+    finally:
+        producer.cancel()
+        for task in tasks:
+            task.cancel()
+        if on_done is not None and index:
+            on_done(index, wasted)
+
+
+async def resolve_first_candidate(
+    results: AsyncIterator[Optional[tuple[dict, Optional[str]]]],
+    on_leftovers: Optional[Callable[[AsyncIterator], None]] = None
+) -> Optional[tuple[dict, Optional[str]]]:
+    """
+    Return the first valid result of `resolve_candidate_stream` in rank order.
+    The rest of the stream is handed to `on_leftovers` if given, otherwise it is
+    cancelled once a winner is known.
+    """
+    handed_off = False
+    try:
+        async for result in results:
+            if result:
+                if on_leftovers is not None:
+                    on_leftovers(results)
+                    handed_off = True
+                return result
+        return None
+    finally:
+        if not handed_off:
+            await results.aclose()
+
+
+def queued_candidate(movie_data: dict) -> dict:
+    """Session queue / recommendation cache entry for a resolved AI suggestion."""
+    return {
+        "tmdb_id": movie_data["id"],
+        "title": movie_data["title"],
+        "reason": movie_data.get("ai_reason", ""),
+    }
+
+
+async def enqueue_resolved_candidates(
+    db: Database,
+    session_id: int,
+    results: AsyncIterator[Optional[tuple[dict, Optional[str]]]]
+):
+    """Drain a `resolve_candidate_stream` and queue the valid results for the session."""
+    candidates = []
+    try:
+        async for result in results:
+            if result:
+                candidates.append(queued_candidate(result[0]))
+    finally:
+        await results.aclose()
+
+    if candidates:
+        await db.add_session_candidates(session_id, candidates)
+
+
+async def close_streams(streams: list[AsyncIterator]):
+    """Close result streams nobody will drain, releasing their AI request and resolver tasks."""
+    for results in streams:
+        await results.aclose()
+
+
+async def pop_queued_candidate(
+    db: Database,
+    tmdb: TMDBService,
+    session_id: int,
+    excluded_ids: set[int],
+    tmdb_language: str
+) -> Optional[tuple[dict, Optional[str]]]:
+    """Take the next still-valid candidate from the session's queue."""
+    while True:
+        candidate = await db.pop_session_candidate(session_id)
+        if candidate is None:
+            return None
+
+        # Skip titles shown or watched since they were queued
+        if candidate["tmdb_id"] in excluded_ids:
+            continue
+
+        movie_data, trailer_url = await tmdb.get_movie_bundle(candidate["tmdb_id"], tmdb_language)
+        if movie_data:
+            movie_data["ai_reason"] = candidate["reason"]
+            return movie_data, trailer_url
+
+
+def candidate_count(suggested: int, wasted: int) -> int:
+    """
+    How many suggestions to ask the AI for so that about AI_CANDIDATES remain usable,
+    given the user's history; the prior assumes one in five is wasted.
+    """
+    waste_rate = min((wasted + 1) / (suggested + 5), 0.75)
+    return min(AI_MAX_CANDIDATES, math.ceil(AI_CANDIDATES / (1 - waste_rate)))
+
+
+async def prepare_ai_request(db: Database, user_id: int) -> tuple[list[str], int]:
+    """Recently seen titles to keep out of the prompt, and how many suggestions to ask for."""
+    excluded_titles = await db.get_recent_excluded_titles(user_id, AI_EXCLUDED_TITLES)
+    suggested, wasted = await db.get_ai_candidate_stats(user_id)
+    return excluded_titles, candidate_count(suggested, wasted)
+
+
+def track_ai_candidates(db: Database, user_id: int) -> Callable[[int, int], None]:
+    """`on_done` callback recording the wasted-candidate ratio of one AI call."""
+    def on_done(suggested: int, wasted: int):
+        logger.info(f"AI candidates for user {user_id}: {wasted}/{suggested} wasted")
+        spawn(db.record_ai_candidates(user_id, suggested, wasted), name=f"ai-stats-{user_id}")
+    return on_done
+
+
+async def refill_candidate_queue(
+    db: Database,
+    tmdb: TMDBService,
+    ai: AIService,
+    user_id: int,
+    session_id: int,
+    profile_dict: dict,
+    dynamic_answers: dict,
+    excluded_ids: set[int],
+    lang: str
+):
+    """Ask the AI for more candidates if the session's queue is running low."""
+    # A user-facing call for the session is streaming; its leftovers will fill the queue
+    if session_id in _refilling_sessions or session_id in _foreground_ai_calls:
+        return
+
+    _refilling_sessions.add(session_id)
+    try:
+        queued_ids = await db.get_session_candidate_ids(session_id)
+        if len(queued_ids) >= CANDIDATE_QUEUE_LOW_WATERMARK:
+            return
+
+        exclude = excluded_ids | set(queued_ids)
+        tmdb_language = "uk-UA" if lang == "uk" else "en-US"
+
+        if RECOMMENDATION_MODE == "local":
+            ranked = await LocalRecommender(tmdb).recommend(
+                profile_dict,
+                dynamic_answers,
+                exclude,
+                tmdb_language
+            )
+            reason = get_mood_reason(dynamic_answers.get("mood", ""), lang)
+            await db.add_session_candidates(session_id, [
+                {"tmdb_id": movie["id"], "title": movie.get("title", ""), "reason": reason}
+                for movie in ranked
+            ])
+            return
+
+        # Candidates found for the same profile and answers skip the LLM entirely
+        cache_key = context_key(profile_dict, dynamic_answers, lang)
+        cached = recommendation_cache.get(
+            cache_key, exclude, profile_dict, get_mood_reason(dynamic_answers.get("mood", ""), lang)
+        )
+        if cached:
+            await db.add_session_candidates(session_id, cached)
+            return
+
+        excluded_titles, count = await prepare_ai_request(db, user_id)
+        recommendations = ai.stream_recommendations(
+            profile_dict,
+            dynamic_answers,
+            excluded_titles,
+            count=count,
+            lang=lang,
+            background=True
+        )
+        await enqueue_resolved_candidates(
+            db,
+            session_id,
+            resolve_candidate_stream(
+                tmdb,
+                recommendations,
+                exclude,
+                tmdb_language,
+                cache_key,
+                on_done=track_ai_candidates(db, user_id)
+            )
+        )
+    finally:
+        _refilling_sessions.discard(session_id)
+
+
+async def find_ai_movie(
+    db: Database,
+    tmdb: TMDBService,
+    ai: AIService,
+    user_id: int,
+    profile_dict: dict,
+    dynamic_answers: dict,
+    excluded_ids: set[int],
+    lang: str,
+    on_leftovers: Optional[Callable[[AsyncIterator], None]] = None
+) -> Optional[tuple[dict, Optional[str]]]:
+    """Pick a movie from a fresh AI call."""
+    tmdb_language = "uk-UA" if lang == "uk" else "en-US"
+
+    try:
+        excluded_titles, count = await prepare_ai_request(db, user_id)
+        recommendations = ai.stream_recommendations(
+            profile_dict,
+            dynamic_answers,
+            excluded_titles,
+            count=count,
+            lang=lang
+        )
+
+        # Find movie in TMDB, resolving suggestions in parallel while the AI is still writing
+        return await resolve_first_candidate(
+            resolve_candidate_stream(
+                tmdb,
+                recommendations,
+                excluded_ids,
+                tmdb_language,
+                context_key(profile_dict, dynamic_answers, lang),
+                on_done=track_ai_candidates(db, user_id)
+            ),
+            on_leftovers=on_leftovers
+        )
+
+    except Exception as e:
+        logger.error(f"AI recommendation failed: {e}")
+
+    return None
+
+
+async def find_pooled_movie(
+    db: Database,
+    tmdb: TMDBService,
+    profile_dict: dict,
+    dynamic_answers: dict,
+    excluded_ids: set[int],
+    lang: str
+) -> Optional[tuple[dict, Optional[str]]]:
+    """Pick from the pool precomputed off-peak for the user's answers and liked genre."""
+    tmdb_language = "uk-UA" if lang == "uk" else "en-US"
+
+    for candidate in await get_pool(db, profile_dict, dynamic_answers, excluded_ids, lang):
+        movie_data, trailer_url = await tmdb.get_movie_bundle(candidate["tmdb_id"], tmdb_language)
+        if movie_data:
+            movie_data["ai_reason"] = candidate["reason"]
+            return movie_data, trailer_url
+
+    return None
+
+
+def get_mood_reason(mood: str, lang: str) -> str:
+    """Generic reason for picks that did not come with an AI explanation."""
+    mood_reasons = {
+        "happy": "Цей фільм підійде для гарного настрою!" if lang == "uk" else "This movie is great for a good mood!",
+        "sad": "Цей фільм допоможе відволіктися." if lang == "uk" else "This movie will help distract you.",
+        "stressed": "Розслабся і насолоджуйся переглядом." if lang == "uk" else "Relax and enjoy watching.",
+        "bored": "Цей фільм точно не дасть тобі нудьгувати!" if lang == "uk" else "This movie won't let you get bored!",
+        "romantic": "Ідеально для романтичного вечора." if lang == "uk" else "Perfect for a romantic evening.",
+        "adventurous": "Приготуйся до пригод!" if lang == "uk" else "Get ready for adventure!",
+        "thoughtful": "Цей фільм дасть тобі про що подумати." if lang == "uk" else "This movie will give you something to think about.",
+        "tired": "Легкий для перегляду після важкого дня." if lang == "uk" else "Easy to watch after a hard day.",
+    }
+    return mood_reasons.get(mood, "")
+
+
+async def find_local_movie(
+    tmdb: TMDBService,
+    profile_dict: dict,
+    dynamic_answers: dict,
+    excluded_ids: set[int],
+    lang: str
+) -> Optional[tuple[dict, Optional[str]]]:
+    """Pick the best locally ranked TMDB candidate for the user's profile and answers."""
+    tmdb_language = "uk-UA" if lang == "uk" else "en-US"
+    ranked = await LocalRecommender(tmdb).recommend(
+        profile_dict,
+        dynamic_answers,
+        excluded_ids,
+        tmdb_language
+    )
+
+    # Last resort if the candidate pool could not be loaded
+    if not ranked:
+        ranked = [
+            movie for movie in await tmdb.get_popular_movies(language=tmdb_language)
+            if movie.get("id") not in excluded_ids
+        ]
+
+    for movie in ranked:
+        movie_data, trailer_url = await tmdb.get_movie_bundle(movie["id"], tmdb_language)
+        if movie_data:
+            movie_data["ai_reason"] = get_mood_reason(dynamic_answers.get("mood", ""), lang)
+            return movie_data, trailer_url
+
+    return None
+
+
+async def find_cf_movie(
+    db: Database,
+    tmdb: TMDBService,
+    user_id: int,
+    excluded_ids: set[int],
+    lang: str
+) -> Optional[tuple[dict, Optional[str]]]:
+    """Pick a movie that users with similar taste saved or watched (see services.collaborative)."""
+    tmdb_language = "uk-UA" if lang == "uk" else "en-US"
+    saved = await db.get_saved_movies(user_id)
+    seeds = [movie["tmdb_id"] for movie in saved] + await db.get_watched_movie_ids(user_id)
+
+    for tmdb_id, _ in await db.get_movie_neighbors(seeds):
+        if tmdb_id in excluded_ids:
+            continue
+        movie_data, trailer_url = await tmdb.get_movie_bundle(tmdb_id, tmdb_language)
+        if movie_data:
+            movie_data["ai_reason"] = get_text("reason_similar_users", lang)
+            return movie_data, trailer_url
+
+    return None
+
+
+async def find_similar_movie(
+    db: Database,
+    tmdb: TMDBService,
+    user_id: int,
+    profile_dict: dict,
+    excluded_ids: set[int],
+    lang: str
+) -> Optional[tuple[dict, Optional[str]]]:
+    """Pick a movie close to the user's favorite and saved titles in the TF-IDF index."""
+    await similarity_index.refresh(db)
+
+    saved = await db.get_saved_movies(user_id)
+    like_ids = similarity_index.resolve_titles(profile_dict.get("favorite_movies", ""))
+    like_ids += [movie["tmdb_id"] for movie in saved]
+    dislike_ids = similarity_index.resolve_titles(profile_dict.get("disliked_movies", ""))
+
+    tmdb_language = "uk-UA" if lang == "uk" else "en-US"
+    for tmdb_id, _ in similarity_index.similar(like_ids, dislike_ids, excluded_ids):
+        movie_data, trailer_url = await tmdb.get_movie_bundle(tmdb_id, tmdb_language)
+        if movie_data:
+            movie_data["ai_reason"] = get_text("reason_similar_movies", lang)
+            return movie_data, trailer_url
+
+    return None
+
+
+def build_card(
+    movie_data: dict,
+    trailer_url: Optional[str],
+    session_id: int,
+    is_saved: bool,
+    lang: str
+) -> dict:
+    """Render the caption and keyboard of a recommendation card."""
+    card_text = format_movie_card(
+        movie_data,
+        reason=movie_data.get("ai_reason", ""),
+        lang=lang
+    )
+
+    keyboard = get_recommendation_keyboard(
+        lang,
+        movie_data["id"],
+        session_id,
+        is_saved,
+        trailer_url
+    )
+
+    return {
+        "movie_data": movie_data,
+        "text": f"{get_text('recommendation_title', lang)}\n\n{card_text}",
+        "keyboard": keyboard,
+    }
+
+
+async def prefetch_next_card(
+    db: Database,
+    tmdb: TMDBService,
+    ai: AIService,
+    user_id: int,
+    session_id: int,
+    profile_dict: dict,
+    dynamic_answers: dict,
+    excluded_ids: set[int],
+    lang: str,
+    card: asyncio.Future,
+    pending: list[AsyncIterator]
+):
+    """
+    Prepare the session's next card in the background and publish it via `card`.
+    `pending` are the unused result streams of the AI call that produced the current card.
+    """
+    tmdb_language = "uk-UA" if lang == "uk" else "en-US"
+    try:
+        # Keep unused AI suggestions for "Next"
+        try:
+            for results in pending:
+                await enqueue_resolved_candidates(db, session_id, results)
+        finally:
+            # Cancelled midway: the streams not drained yet would keep their AI request open
+            await close_streams(pending)
+        if not await db.get_session_candidate_ids(session_id):
+            await refill_candidate_queue(
+                db, tmdb, ai, user_id, session_id, profile_dict, dynamic_answers, excluded_ids, lang
+            )
+
+        queued = await pop_queued_candidate(db, tmdb, session_id, excluded_ids, tmdb_language)
+        if queued:
+            movie_data, trailer_url = queued
+            excluded_ids = excluded_ids | {movie_data["id"]}
+            is_saved = await db.is_movie_saved(user_id, movie_data["id"])
+            card.set_result(build_card(movie_data, trailer_url, session_id, is_saved, lang))
+    finally:
+        if not card.done():
+            card.set_result(None)
+
+    # Top the queue up for the card after this one
+    await refill_candidate_queue(
+        db, tmdb, ai, user_id, session_id, profile_dict, dynamic_answers, excluded_ids, lang
+    )
+
+
+def start_prefetch(
+    db: Database,
+    tmdb: TMDBService,
+    ai: AIService,
+    user_id: int,
+    session_id: int,
+    profile_dict: dict,
+    dynamic_answers: dict,
+    excluded_ids: set[int],
+    lang: str,
+    pending: list[AsyncIterator]
+):
+    """Start preparing the next card of the user's session."""
+    cancel_prefetch(user_id)
+
+    card = asyncio.get_running_loop().create_future()
+    task = spawn(
+        prefetch_next_card(
+            db,
+            tmdb,
+            ai,
+            user_id,
+            session_id,
+            profile_dict,
+            dynamic_answers,
+            excluded_ids,
+            lang,
+            card,
+            pending
+        ),
+        name=f"prefetch-{session_id}"
+    )
+    task.add_done_callback(lambda done: close_streams_if_cancelled(done, pending))
+    _prefetches[user_id] = {"session_id": session_id, "task": task, "card": card}
+
+
+def close_streams_if_cancelled(task: asyncio.Task, streams: list[AsyncIterator]):
+    # A task cancelled before its first step never runs its finally blocks
+    if task.cancelled():
+        spawn(close_streams(streams), name="close-streams")
+
+
+def cancel_prefetch(user_id: int):
+    """Drop the card prepared for the user, e.g. when they leave the session."""
+    prefetch = _prefetches.pop(user_id, None)
+    if prefetch:
+        prefetch["task"].cancel()
+
+
+async def take_prefetched_card(
+    db: Database,
+    user_id: int,
+    session_id: int,
+    deadline: float
+) -> Optional[dict]:
+    """
+    Return the card prepared for this session, waiting until `deadline` (loop time) if still
+    in progress. A card that is not ready in time goes to the session's queue once it is.
+    """
+    prefetch = _prefetches.pop(user_id, None)
+    if prefetch is None:
+        return None
+
+    if prefetch["session_id"] != session_id:
+        prefetch["task"].cancel()
+        return None
+
+    # The task keeps running after publishing the card to refill the queue
+    timeout = max(deadline - asyncio.get_running_loop().time(), 0)
+    try:
+        return await asyncio.wait_for(asyncio.shield(prefetch["card"]), timeout=timeout)
+    except asyncio.TimeoutError:
+        logger.warning(f"Prefetched card for session {session_id} missed the soft deadline")
+        spawn(queue_prefetched_card(db, session_id, prefetch["card"]), name=f"late-card-{session_id}")
+        return None
+
+
+async def queue_prefetched_card(db: Database, session_id: int, card: asyncio.Future):
+    """Keep a prefetched card that was not ready in time for the session's "Next"."""
+    try:
+        result = await asyncio.wait_for(card, timeout=REC_HARD_DEADLINE)
+    except asyncio.TimeoutError:
+        logger.warning(f"Prefetched card for session {session_id} never became ready")
+        return
+
+    if result:
+        await db.add_session_candidates(session_id, [queued_candidate(result["movie_data"])])
+
+
+async def find_primary_movie(
+    db: Database,
+    tmdb: TMDBService,
+    ai: AIService,
+    user_id: int,
+    session_id: int,
+    profile_dict: dict,
+    dynamic_answers: dict,
+    excluded_ids: set[int],
+    lang: str,
+    on_leftovers: Optional[Callable[[AsyncIterator], None]] = None
+) -> Optional[tuple[dict, Optional[str]]]:
+    """The session queue, then (in "ai" mode) shared caches, precomputed pools and a fresh AI call."""
+    tmdb_language = "uk-UA" if lang == "uk" else "en-US"
+
+    # Serve already-resolved candidates queued for this session first
+    resolved = await pop_queued_candidate(db, tmdb, session_id, excluded_ids, tmdb_language)
+    if resolved or RECOMMENDATION_MODE != "ai":
+        return resolved
+
+    # Then candidates the AI gave for the same profile and answers
+    cached = recommendation_cache.get(
+        context_key(profile_dict, dynamic_answers, lang),
+        excluded_ids,
+        profile_dict,
+        get_mood_reason(dynamic_answers.get("mood", ""), lang)
+    )
+    if cached:
+        await db.add_session_candidates(session_id, cached)
+        resolved = await pop_queued_candidate(db, tmdb, session_id, excluded_ids, tmdb_language)
+        if resolved:
+            return resolved
+
+    # A pool precomputed off-peak is served right away; the prefetch that follows
+    # asks the AI for candidates personalized to this user
+    resolved = await find_pooled_movie(db, tmdb, profile_dict, dynamic_answers, excluded_ids, lang)
+    if resolved:
+        return resolved
+
+    _foreground_ai_calls[session_id] = _foreground_ai_calls.get(session_id, 0) + 1
+    try:
+        return await find_ai_movie(
+            db,
+            tmdb,
+            ai,
+            user_id,
+            profile_dict,
+            dynamic_answers,
+            excluded_ids,
+            lang,
+            on_leftovers=on_leftovers
+        )
+    finally:
+        _foreground_ai_calls[session_id] -= 1
+        if not _foreground_ai_calls[session_id]:
+            del _foreground_ai_calls[session_id]
+
+
+async def find_fallback_movie(
+    db: Database,
+    tmdb: TMDBService,
+    user_id: int,
+    profile_dict: dict,
+    dynamic_answers: dict,
+    excluded_ids: set[int],
+    lang: str
+) -> Optional[tuple[dict, Optional[str]]]:
+    """Paths that need no LLM: collaborative filtering, TF-IDF similarity, then local ranking."""
+    # "Users like you saved X" from the offline collaborative-filtering model
+    resolved = await find_cf_movie(db, tmdb, user_id, excluded_ids, lang)
+
+    # Movies like the user's favorites, from the local TF-IDF index
+    if not resolved:
+        resolved = await find_similar_movie(db, tmdb, user_id, profile_dict, excluded_ids, lang)
+
+    # Rank TMDB candidates locally against the user's profile
+    if not resolved:
+        logger.info("Using local ranking for recommendations")
+        resolved = await find_local_movie(
+            tmdb,
+            profile_dict,
+            dynamic_answers,
+            excluded_ids,
+            lang
+        )
+
+    return resolved
+
+
+async def find_movie_hedged(
+    primary: Awaitable[Optional[tuple[dict, Optional[str]]]],
+    fallback: Callable[[], Awaitable[Optional[tuple[dict, Optional[str]]]]],
+    soft_deadline: float,
+    hard_deadline: float,
+    on_primary_late: Optional[Callable[[asyncio.Task], None]] = None
+) -> Optional[tuple[dict, Optional[str]]]:
+    """
+    Run `primary`; start `fallback` once it gives up or `soft_deadline` passes, and return the
+    first good result. Nothing is awaited past `hard_deadline`; both deadlines are loop time.
+    A primary still running at the end is handed to `on_primary_late` if given, otherwise cancelled.
+    """
+    loop = asyncio.get_running_loop()
+    soft_deadline = min(soft_deadline, hard_deadline)
+    primary_task = asyncio.ensure_future(primary)
+    fallback_task = None
+    pending = {primary_task}
+
+    try:
+        while pending:
+            wait_until = hard_deadline if fallback_task else soft_deadline
+            done, pending = await asyncio.wait(
+                pending,
+                timeout=max(wait_until - loop.time(), 0),
+                return_when=asyncio.FIRST_COMPLETED
+            )
+            for task in done:
+                try:
+                    result = task.result()
+                except Exception as e:
+                    logger.warning(f"Recommendation path failed: {e}")
+                    continue
+                if result:
+                    return result
+
+            if fallback_task is None and (not pending or loop.time() >= soft_deadline):
+                if pending:
+                    logger.info("AI path missed the soft deadline, starting the fallback in parallel")
+                fallback_task = asyncio.ensure_future(fallback())
+                pending.add(fallback_task)
+            elif loop.time() >= hard_deadline:
+                logger.warning("Recommendation hit the hard deadline")
+                break
+
+        return None
+    finally:
+        for task in pending:
+            if task is primary_task and on_primary_late is not None:
+                on_primary_late(task)
+            else:
+                task.cancel()
+
+
+async def queue_late_candidate(
+    db: Database,
+    session_id: int,
+    task: asyncio.Task,
+    leftovers: list[AsyncIterator]
+):
+    """
+    Keep the result of a primary path that lost the race for the session's "Next".
+    `leftovers` collects the unused result streams it hands over after the prefetch started.
+    """
+    try:
+        try:
+            result = await asyncio.wait_for(task, timeout=REC_HARD_DEADLINE)
+        except Exception as e:
+            logger.warning(f"Late recommendation path failed: {e}")
+            return
+
+        if result:
+            movie_data, _ = result
+            await db.add_session_candidates(session_id, [queued_candidate(movie_data)])
+        for results in leftovers:
+            await enqueue_resolved_candidates(db, session_id, results)
+    finally:
+        # Failed or cancelled midway: release the streams not drained yet
+        await close_streams(leftovers)
 
 
 async def generate_and_show_recommendation(
     message: Message,
     db: Database,
+    tmdb: TMDBService,
+    ai: AIService,
     user_id: int,
     session_id: int,
     dynamic_answers: dict,
@@ -60,89 +813,46 @@ async def generate_and_show_recommendation(
     # Get excluded movie IDs (shown + watched)
     shown_ids = await db.get_shown_movie_ids(user_id)
     watched_ids = await db.get_watched_movie_ids(user_id)
-    excluded_ids = list(set(shown_ids + watched_ids))
-
-    tmdb_language = "uk-UA" if lang == "uk" else "en-US"
-    movie_data = None
+    excluded_ids = set(shown_ids + watched_ids)
 
-    # Try AI recommendations first
-    try:
-        recommendations = await ai_service.generate_recommendations(
-            profile_dict,
-            dynamic_answers,
-            excluded_ids,
-            count=5,
-            lang=lang
-        )
+    leftovers: list[AsyncIterator] = []
+    # One time budget for the whole recommendation, prefetch wait included
+    now = asyncio.get_running_loop().time()
+    soft_deadline = now + REC_SOFT_DEADLINE
+    hard_deadline = now + REC_HARD_DEADLINE
 
-        if recommendations:
-            # Find movie in TMDB
-            for rec in recommendations:
-                title = rec.get("title", "")
-                year = rec.get("year")
+    # Serve the card prepared in the background after the previous one
+    card = await take_prefetched_card(db, user_id, session_id, soft_deadline)
+    if card and card["movie_data"]["id"] in excluded_ids:
+        card = None
 
-                # Search in TMDB
-                search_results = await tmdb_service.search_movie(title, tmdb_language)
-
-                for result in search_results:
-                    result_year = result.get("release_date", "")[:4]
-                    if year and result_year and str(year) != result_year:
-                        continue
+    if card is None:
+        # Queue, shared caches and the AI first; if they are slow, the local paths race them
+        resolved = await find_movie_hedged(
+            find_primary_movie(
+                db, tmdb, ai, user_id, session_id, profile_dict, dynamic_answers, excluded_ids, lang,
+                on_leftovers=leftovers.append
+            ),
+            lambda: find_fallback_movie(db, tmdb, user_id, profile_dict, dynamic_answers, excluded_ids, lang),
+            soft_deadline,
+            hard_deadline,
+            on_primary_late=lambda task: spawn(
+                queue_late_candidate(db, session_id, task, leftovers), name=f"late-candidate-{session_id}"
+            )
+        )
 
-                    tmdb_id = result.get("id")
-                    if tmdb_id in excluded_ids:
-                        continue
+        if not resolved:
+            await message.edit_text(get_text("error_occurred", lang))
+            return
 
-                    # Get full movie details
-                    movie_data = await tmdb_service.get_movie_details(tmdb_id, tmdb_language)
-                    if movie_data:
-                        movie_data["ai_reason"] = rec.get("reason", "")
-                        break
+        movie_data, trailer_url = resolved
 
-                if movie_data:
-                    break
+        # Check if movie is saved
+        is_saved = await db.is_movie_saved(user_id, movie_data["id"])
 
-    except Exception as e:
-        logger.error(f"AI recommendation failed: {e}")
+        card = build_card(movie_data, trailer_url, session_id, is_saved, lang)
 
-    # Fallback: use TMDB discover based on user's preferred genres
-    if not movie_data:
-        logger.info("Using TMDB fallback for recommendations")
-        genre_ids = get_genre_ids_from_profile(profile_dict.get("genres_like", []))
-
-        if genre_ids:
-            # Discover movies by user's genres
-            discovered = await tmdb_service.discover_movies(
-                genres=genre_ids[:3],  # Top 3 genres
-                vote_average_min=6.5,
-                language=tmdb_language
-            )
-        else:
-            # Fallback to popular movies
-            discovered = await tmdb_service.get_popular_movies(language=tmdb_language)
-
-        for movie in discovered:
-            if movie.get("id") not in excluded_ids:
-                movie_data = await tmdb_service.get_movie_details(movie["id"], tmdb_language)
-                if movie_data:
-                    # Generate a simple reason based on mood
-                    mood = dynamic_answers.get("mood", "")
-                    mood_reasons = {
-                        "happy": "Цей фільм підійде для гарного настрою!" if lang == "uk" else "This movie is great for a good mood!",
-                        "sad": "Цей фільм допоможе відволіктися." if lang == "uk" else "This movie will help distract you.",
-                        "stressed": "Розслабся і насолоджуйся переглядом." if lang == "uk" else "Relax and enjoy watching.",
-                        "bored": "Цей фільм точно не дасть тобі нудьгувати!" if lang == "uk" else "This movie won't let you get bored!",
-                        "romantic": "Ідеально для романтичного вечора." if lang == "uk" else "Perfect for a romantic evening.",
-                        "adventurous": "Приготуйся до пригод!" if lang == "uk" else "Get ready for adventure!",
-                        "thoughtful": "Цей фільм дасть тобі про що подумати." if lang == "uk" else "This movie will give you something to think about.",
-                        "tired": "Легкий для перегляду після важкого дня." if lang == "uk" else "Easy to watch after a hard day.",
-                    }
-                    movie_data["ai_reason"] = mood_reasons.get(mood, "")
-                    break
-
-    if not movie_data:
-        await message.edit_text(get_text("error_occurred", lang))
-        return
+    movie_data = card["movie_data"]
 
     # Save recommendation to DB
     rec_id = await db.add_recommendation(
@@ -151,35 +861,14 @@ async def generate_and_show_recommendation(
         movie_data["title"]
     )
 
-    # Get trailer URL
-    trailer_url = await tmdb_service.get_movie_trailer(movie_data["id"], tmdb_language)
-
-    # Check if movie is saved
-    is_saved = await db.is_movie_saved(user_id, movie_data["id"])
-
-    # Format and send movie card
-    card_text = format_movie_card(
-        movie_data,
-        reason=movie_data.get("ai_reason", ""),
-        lang=lang
-    )
-
-    keyboard = get_recommendation_keyboard(
-        lang,
-        movie_data["id"],
-        session_id,
-        is_saved,
-        trailer_url
-    )
-
     # Send with poster if available
     if movie_data.get("poster_url"):
         try:
             await message.delete()
             await message.answer_photo(
                 photo=movie_data["poster_url"],
-                caption=f"{get_text('recommendation_title', lang)}\n\n{card_text}",
-                reply_markup=keyboard,
+                caption=card["text"],
+                reply_markup=card["keyboard"],
                 parse_mode="Markdown"
             )
         except Exception as e:
@@ -187,39 +876,56 @@ async def generate_and_show_recommendation(
             # Fallback to text only
             try:
                 await message.edit_text(
-                    f"{get_text('recommendation_title', lang)}\n\n{card_text}",
-                    reply_markup=keyboard,
+                    card["text"],
+                    reply_markup=card["keyboard"],
                     parse_mode="Markdown"
                 )
             except Exception:
                 await message.answer(
-                    f"{get_text('recommendation_title', lang)}\n\n{card_text}",
-                    reply_markup=keyboard,
+                    card["text"],
+                    reply_markup=card["keyboard"],
                     parse_mode="Markdown"
                 )
     else:
         try:
             await message.edit_text(
-                f"{get_text('recommendation_title', lang)}\n\n{card_text}",
-                reply_markup=keyboard,
+                card["text"],
+                reply_markup=card["keyboard"],
                 parse_mode="Markdown"
             )
         except Exception:
             await message.answer(
-                f"{get_text('recommendation_title', lang)}\n\n{card_text}",
-                reply_markup=keyboard,
+                card["text"],
+                reply_markup=card["keyboard"],
                 parse_mode="Markdown"
             )
 
+    # Streams a late primary path hands over from here on are left to queue_late_candidate
+    pending = leftovers.copy()
+    leftovers.clear()
+
+    # Users often press "Next" within seconds: prepare that card now
+    start_prefetch(
+        db,
+        tmdb,
+        ai,
+        user_id,
+        session_id,
+        profile_dict,
+        dynamic_answers,
+        excluded_ids | {movie_data["id"]},
+        lang,
+        pending=pending
+    )
+
 
 @router.callback_query(F.data.startswith("rec:save:"))
-async def save_movie(callback: CallbackQuery, db: Database):
+async def save_movie(callback: CallbackQuery, db: Database, tmdb: TMDBService, user: Optional[dict]):
     """Save movie to user's list."""
     parts = callback.data.split(":")
     tmdb_id = int(parts[2])
     session_id = int(parts[3])
 
-    user = await db.get_user(callback.from_user.id)
     lang = user["language"] if user else "uk"
     tmdb_language = "uk-UA" if lang == "uk" else "en-US"
 
@@ -228,8 +934,8 @@ async def save_movie(callback: CallbackQuery, db: Database):
         await callback.answer(get_text("btn_saved_mark", lang))
         return
 
-    # Get movie details
-    movie_data = await tmdb_service.get_movie_details(tmdb_id, tmdb_language)
+    # Get movie details and trailer
+    movie_data, trailer_url = await tmdb.get_movie_bundle(tmdb_id, tmdb_language)
     if movie_data:
         await db.save_movie(
             callback.from_user.id,
@@ -239,7 +945,6 @@ async def save_movie(callback: CallbackQuery, db: Database):
         )
 
         # Update keyboard to show "Saved"
-        trailer_url = await tmdb_service.get_movie_trailer(tmdb_id, tmdb_language)
         new_keyboard = get_recommendation_keyboard(
             lang,
             tmdb_id,
@@ -258,18 +963,23 @@ async def save_movie(callback: CallbackQuery, db: Database):
 
 
 @router.callback_query(F.data.startswith("rec:watched:"))
-async def mark_watched(callback: CallbackQuery, db: Database):
+async def mark_watched(
+    callback: CallbackQuery,
+    db: Database,
+    tmdb: TMDBService,
+    ai: AIService,
+    user: Optional[dict]
+):
     """Mark movie as watched and show next recommendation."""
     parts = callback.data.split(":")
     tmdb_id = int(parts[2])
     session_id = int(parts[3])
 
-    user = await db.get_user(callback.from_user.id)
     lang = user["language"] if user else "uk"
     tmdb_language = "uk-UA" if lang == "uk" else "en-US"
 
     # Get movie title
-    movie_data = await tmdb_service.get_movie_details(tmdb_id, tmdb_language)
+    movie_data = await tmdb.get_movie_details(tmdb_id, tmdb_language)
     title = movie_data["title"] if movie_data else "Unknown"
 
     # Mark as watched
@@ -292,6 +1002,8 @@ async def mark_watched(callback: CallbackQuery, db: Database):
     await generate_and_show_recommendation(
         loading_msg,
         db,
+        tmdb,
+        ai,
         callback.from_user.id,
         session_id,
         session["dynamic_answers"],
@@ -300,11 +1012,16 @@ async def mark_watched(callback: CallbackQuery, db: Database):
 
 
 @router.callback_query(F.data.startswith("rec:next:"))
-async def next_recommendation(callback: CallbackQuery, db: Database):
+async def next_recommendation(
+    callback: CallbackQuery,
+    db: Database,
+    tmdb: TMDBService,
+    ai: AIService,
+    user: Optional[dict]
+):
     """Show next recommendation in current session."""
     session_id = int(callback.data.split(":")[2])
 
-    user = await db.get_user(callback.from_user.id)
     lang = user["language"] if user else "uk"
 
     # Get session data
@@ -325,6 +1042,8 @@ async def next_recommendation(callback: CallbackQuery, db: Database):
     await generate_and_show_recommendation(
         loading_msg,
         db,
+        tmdb,
+        ai,
         callback.from_user.id,
         session_id,
         session["dynamic_answers"],
@@ -334,9 +1053,10 @@ async def next_recommendation(callback: CallbackQuery, db: Database):
 
 
 @router.callback_query(F.data == "rec:new_request")
-async def new_request(callback: CallbackQuery, db: Database):
+async def new_request(callback: CallbackQuery, user: Optional[dict]):
     """Start new dynamic survey for fresh recommendations."""
-    user = await db.get_user(callback.from_user.id)
+    cancel_prefetch(callback.from_user.id)
+
     lang = user["language"] if user else "uk"
 
     try:
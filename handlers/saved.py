@@ -1,3 +1,4 @@
+from typing import Optional
 from aiogram import Router, F
 from aiogram.types import CallbackQuery
 
@@ -9,14 +10,9 @@ from utils.helpers import format_movie_card
 
 router = Router()
 
-tmdb_service = TMDBService()
 
-
-async def show_saved_movies(callback: CallbackQuery, db: Database, page: int = 0):
+async def show_saved_movies(callback: CallbackQuery, db: Database, lang: str, page: int = 0):
     """Display user's saved movies."""
-    user = await db.get_user(callback.from_user.id)
-    lang = user["language"] if user else "uk"
-
     movies = await db.get_saved_movies(callback.from_user.id)
 
     if not movies:
@@ -35,30 +31,26 @@ async def show_saved_movies(callback: CallbackQuery, db: Database, page: int = 0
 
 
 @router.callback_query(F.data.startswith("saved:page:"))
-async def paginate_saved(callback: CallbackQuery, db: Database):
+async def paginate_saved(callback: CallbackQuery, db: Database, user: Optional[dict]):
     """Handle pagination of saved movies."""
     page = int(callback.data.split(":")[2])
-    await show_saved_movies(callback, db, page)
+    await show_saved_movies(callback, db, user["language"] if user else "uk", page)
 
 
 @router.callback_query(F.data.startswith("saved:view:"))
-async def view_saved_movie(callback: CallbackQuery, db: Database):
+async def view_saved_movie(callback: CallbackQuery, tmdb: TMDBService, user: Optional[dict]):
     """View details of a saved movie."""
     tmdb_id = int(callback.data.split(":")[2])
 
-    user = await db.get_user(callback.from_user.id)
     lang = user["language"] if user else "uk"
     tmdb_language = "uk-UA" if lang == "uk" else "en-US"
 
-    # Get movie details from TMDB
-    movie_data = await tmdb_service.get_movie_details(tmdb_id, tmdb_language)
+    # Get movie details and trailer from TMDB
+    movie_data, trailer_url = await tmdb.get_movie_bundle(tmdb_id, tmdb_language)
 
     if movie_data:
         card_text = format_movie_card(movie_data, lang=lang)
 
-        # Get trailer
-        trailer_url = await tmdb_service.get_movie_trailer(tmdb_id, tmdb_language)
-
         from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
         from aiogram.utils.keyboard import InlineKeyboardBuilder
 
@@ -113,15 +105,14 @@ async def view_saved_movie(callback: CallbackQuery, db: Database):
 
 
 @router.callback_query(F.data.startswith("saved:delete:"))
-async def delete_saved_movie(callback: CallbackQuery, db: Database):
+async def delete_saved_movie(callback: CallbackQuery, db: Database, user: Optional[dict]):
     """Delete a movie from saved list."""
     tmdb_id = int(callback.data.split(":")[2])
 
-    user = await db.get_user(callback.from_user.id)
     lang = user["language"] if user else "uk"
 
     await db.delete_saved_movie(callback.from_user.id, tmdb_id)
     await callback.answer(get_text("movie_deleted", lang))
 
     # Return to saved list
-    await show_saved_movies(callback, db)
+    await show_saved_movies(callback, db, lang)
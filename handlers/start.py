@@ -1,3 +1,4 @@
+from typing import Optional
 from aiogram import Router, F
 from aiogram.filters import CommandStart
 from aiogram.types import Message, CallbackQuery
@@ -12,12 +13,10 @@ router = Router()
 
 
 @router.message(CommandStart())
-async def cmd_start(message: Message, db: Database, state: FSMContext):
+async def cmd_start(message: Message, state: FSMContext, user: Optional[dict]):
     """Handle /start command."""
     await state.clear()
 
-    user = await db.get_user(message.from_user.id)
-
     if user is None:
         # New user - show language selection
         await message.answer(
@@ -45,22 +44,19 @@ async def cmd_start(message: Message, db: Database, state: FSMContext):
 
 
 @router.callback_query(F.data.startswith("lang:"))
-async def language_selected(callback: CallbackQuery, db: Database, state: FSMContext):
+async def language_selected(callback: CallbackQuery, db: Database, state: FSMContext, user: Optional[dict]):
     """Handle language selection."""
     lang = callback.data.split(":")[1]
 
     # Create or update user
-    user = await db.get_user(callback.from_user.id)
     if user is None:
-        await db.create_user(callback.from_user.id, lang)
+        user = await db.create_user(callback.from_user.id, lang)
     else:
         await db.update_user_language(callback.from_user.id, lang)
 
     await callback.answer(get_text("language_set", lang))
 
     # Check if profile is completed
-    user = await db.get_user(callback.from_user.id)
-
     if not user["base_profile_completed"]:
         # Start base survey
         await callback.message.edit_text(get_text("welcome", lang))
@@ -155,6 +155,8 @@ TEXTS = {
     "movie_saved": "Movie saved!",
     "movie_watched": "Marked as watched!",
     "no_trailer": "Sorry, trailer not found.",
+    "reason_similar_users": "Saved by users with taste similar to yours.",
+    "reason_similar_movies": "Similar to movies you love.",
 
     # Profile
     "your_profile": "Your profile:",
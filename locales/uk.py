@@ -155,6 +155,8 @@ TEXTS = {
     "movie_saved": "Фільм збережено!",
     "movie_watched": "Позначено як переглянутий!",
     "no_trailer": "На жаль, трейлер не знайдено.",
+    "reason_similar_users": "Фільм, який зберегли користувачі зі схожим смаком.",
+    "reason_similar_movies": "Схожий на фільми, які тобі подобаються.",
 
     # Profile
     "your_profile": "Твій профіль:",
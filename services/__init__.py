@@ -1,4 +1,5 @@
 from .tmdb import TMDBService
 from .ai_service import AIService
+from .recommender import LocalRecommender
 
-__all__ = ["TMDBService", "AIService"]
+__all__ = ["TMDBService", "AIService", "LocalRecommender"]
@@ -1,70 +1,289 @@
+import asyncio
 import json
 import logging
+from typing import AsyncIterator, Optional, Union
 import anthropic
-from config import ANTHROPIC_API_KEY
+from config import (
+    ANTHROPIC_API_KEY,
+    AI_MODEL,
+    AI_MAX_CONCURRENCY,
+    AI_BACKGROUND_CONCURRENCY,
+    AI_RECOMMENDATIONS_TIMEOUT,
+    AI_REASON_TIMEOUT,
+    AI_MAX_RETRIES,
+    AI_STREAMING,
+    AI_PROMPT_CACHING,
+    AI_CACHE_MIN_TOKENS,
+)
 
 logger = logging.getLogger(__name__)
 
 
+# Static instructions shared by every recommendation call; kept byte-identical so the
+# provider can cache them as a prompt prefix once the prefix is long enough to qualify
+RECOMMENDATION_SYSTEM = """You are a movie recommendation expert. Based on the user's profile and current state, suggest movies that would be perfect for them right now.
+
+The user message is compact. Each line is CODE=value, lists are comma-separated, missing lines mean no preference.
+Profile codes: EL emotions they like, ED emotions they dislike, CX complexity, FAV favorite movies, DIS disliked movies, GL genres they like, GD genres they dislike, VS visual style, CL characters they like, CD characters they dislike, TB taboos, AF desired afterfeel, LANG language for reasons (uk Ukrainian, en English).
+State codes: MO mood, EN energy level, CO watching with, TI available time, SP preference for new/classic, RQ specific request, SEEN movies already seen (never recommend these), N number of movies to recommend.
+
+IMPORTANT: Return ONLY a valid JSON array. No additional text, no markdown, no explanation.
+Each movie should have: "title" (original English title), "year" (release year as number), "reason" (why you recommend it in the LANG language).
+
+Example format:
+[{"title": "The Shawshank Redemption", "year": 1994, "reason": "Цей фільм подарує тобі надію..."}]"""
+
+PROFILE_CODES = [
+    ("EL", "emotions_like"),
+    ("ED", "emotions_dislike"),
+    ("CX", "complexity"),
+    ("FAV", "favorite_movies"),
+    ("DIS", "disliked_movies"),
+    ("GL", "genres_like"),
+    ("GD", "genres_dislike"),
+    ("VS", "visual_style"),
+    ("CL", "characters_like"),
+    ("CD", "characters_dislike"),
+    ("TB", "taboo"),
+    ("AF", "afterfeel"),
+]
+
+STATE_CODES = [
+    ("MO", "mood"),
+    ("EN", "energy"),
+    ("CO", "company"),
+    ("TI", "time"),
+    ("SP", "seen_preference"),
+    ("RQ", "specific_request"),
+]
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (about 4 characters per token), enough to size cache breakpoints."""
+    return len(text) // 4
+
+
+def encode_fields(values: dict, codes: list[tuple[str, str]]) -> str:
+    """Render known fields as CODE=value lines; lists are sorted so equal profiles encode identically."""
+    lines = []
+    for code, key in codes:
+        value = values.get(key)
+        if isinstance(value, (list, tuple, set)):
+            value = ",".join(sorted(str(item) for item in value))
+        value = " ".join(str(value or "").split())
+        if value and value != "any":
+            lines.append(f"{code}={value}")
+    return "\n".join(lines)
+
+
+class JSONArrayStreamParser:
+    """Incrementally extract the objects of a top-level JSON array from streamed text."""
+
+    def __init__(self):
+        self.depth = 0
+        self.in_string = False
+        self.escape = False
+        self.finished = False
+        self.buffer: list[str] = []
+
+    def feed(self, text: str) -> list[dict]:
+        """Consume a chunk and return the objects completed by it."""
+        items = []
+        for ch in text:
+            if self.finished:
+                break
+            if self.depth >= 2:
+                self.buffer.append(ch)
+
+            if self.in_string:
+                if self.escape:
+                    self.escape = False
+                elif ch == "\\":
+                    self.escape = True
+                elif ch == '"':
+                    self.in_string = False
+            elif self.depth == 0:
+                # Skip markdown fences or prose before the array
+                if ch == "[":
+                    self.depth = 1
+            elif ch == '"':
+                self.in_string = True
+            elif ch in "[{":
+                if self.depth == 1:
+                    self.buffer = [ch]
+                self.depth += 1
+            elif ch in "]}":
+                self.depth -= 1
+                if self.depth == 1:
+                    try:
+                        item = json.loads("".join(self.buffer))
+                    except json.JSONDecodeError as e:
+                        logger.warning(f"Skipping malformed streamed item: {e}")
+                    else:
+                        if isinstance(item, dict):
+                            items.append(item)
+                    self.buffer = []
+                elif self.depth == 0:
+                    self.finished = True
+        return items
+
+
 class AIService:
     def __init__(self):
-        self.client = anthropic.Anthropic(api_key=ANTHROPIC_API_KEY)
+        self.client = anthropic.AsyncAnthropic(
+            api_key=ANTHROPIC_API_KEY,
+            max_retries=AI_MAX_RETRIES,
+        )
+        self.semaphore = asyncio.Semaphore(AI_MAX_CONCURRENCY)
+        self.background_semaphore = asyncio.Semaphore(AI_BACKGROUND_CONCURRENCY)
+        self.request_count = 0
+        self.input_tokens = 0
+        self.cache_read_tokens = 0
+        self.cache_write_tokens = 0
+        self.output_tokens = 0
+
+    async def close(self):
+        await self.client.close()
+
+    async def _acquire(self, background: bool):
+        """Take a concurrency slot; background calls first need one of the fewer background slots."""
+        if not background:
+            await self.semaphore.acquire()
+            return
+
+        await self.background_semaphore.acquire()
+        try:
+            await self.semaphore.acquire()
+        except BaseException:
+            self.background_semaphore.release()
+            raise
+
+    def _release(self, background: bool):
+        self.semaphore.release()
+        if background:
+            self.background_semaphore.release()
+
+    async def _create_message(
+        self,
+        prompt: Union[str, list[dict]],
+        max_tokens: int,
+        timeout: float,
+        system: Optional[list[dict]] = None,
+        label: str = "message",
+        background: bool = False
+    ):
+        """Send a single-turn prompt, bounded by the concurrency limit and a deadline."""
+        extra = {"system": system} if system else {}
+
+        async def _call():
+            await self._acquire(background)
+            try:
+                self.request_count += 1
+                return await self.client.messages.create(
+                    model=AI_MODEL,
+                    max_tokens=max_tokens,
+                    messages=[
+                        {"role": "user", "content": prompt}
+                    ],
+                    timeout=timeout,
+                    **extra,
+                )
+            finally:
+                self._release(background)
+
+        # The deadline also covers time spent waiting for a free slot
+        message = await asyncio.wait_for(_call(), timeout=timeout)
+        self._record_input_usage(message.usage, label)
+        self.output_tokens += message.usage.output_tokens
+        return message
+
+    def _record_input_usage(self, usage, label: str):
+        # Cache counters are only reported when prompt caching is in play
+        cache_read = getattr(usage, "cache_read_input_tokens", None) or 0
+        cache_write = getattr(usage, "cache_creation_input_tokens", None) or 0
+        self.input_tokens += usage.input_tokens
+        self.cache_read_tokens += cache_read
+        self.cache_write_tokens += cache_write
+        logger.info(
+            f"AI {label}: {usage.input_tokens} input tokens, "
+            f"{cache_read} read from prompt cache, {cache_write} written to it"
+        )
+
+    def usage_stats(self) -> dict:
+        """Requests sent and tokens billed since startup."""
+        return {
+            "requests": self.request_count,
+            "input_tokens": self.input_tokens,
+            "cache_read_tokens": self.cache_read_tokens,
+            "cache_write_tokens": self.cache_write_tokens,
+            "output_tokens": self.output_tokens,
+        }
+
+    @staticmethod
+    def _recommendations_request(
+        base_profile: dict,
+        dynamic_state: dict,
+        excluded_titles: list[str],
+        count: int,
+        lang: str
+    ) -> dict:
+        """
+        System block and user content of a recommendation call. With prompt caching on, one
+        breakpoint goes after the longest prefix (system, or system plus the per-user profile)
+        that reaches AI_CACHE_MIN_TOKENS; the provider ignores breakpoints on shorter prefixes.
+        """
+        profile_block = "\n".join(filter(None, [encode_fields(base_profile, PROFILE_CODES), f"LANG={lang}"]))
+        state_block = "\n".join(filter(None, [
+            encode_fields(dynamic_state, STATE_CODES),
+            f"SEEN={'; '.join(excluded_titles)}" if excluded_titles else "",
+            f"N={count}",
+        ]))
+
+        system = [{"type": "text", "text": RECOMMENDATION_SYSTEM}]
+        profile = {"type": "text", "text": profile_block}
+        if AI_PROMPT_CACHING:
+            system_tokens = estimate_tokens(RECOMMENDATION_SYSTEM)
+            if system_tokens + estimate_tokens(profile_block) >= AI_CACHE_MIN_TOKENS:
+                profile["cache_control"] = {"type": "ephemeral"}
+            elif system_tokens >= AI_CACHE_MIN_TOKENS:
+                system[0]["cache_control"] = {"type": "ephemeral"}
+
+        return {
+            "system": system,
+            "messages": [
+                {"role": "user", "content": [profile, {"type": "text", "text": state_block}]}
+            ],
+        }
+
+    @staticmethod
+    def _recommendations_max_tokens(count: int) -> int:
+        # About 150 tokens per suggestion with its reason
+        return max(1500, 150 * count + 200)
 
     async def generate_recommendations(
         self,
         base_profile: dict,
         dynamic_state: dict,
-        excluded_ids: list[int] = None,
+        excluded_titles: list[str] = None,
         count: int = 5,
-        lang: str = "uk"
+        lang: str = "uk",
+        background: bool = False
     ) -> list[dict]:
         """
         Generate movie recommendations based on user profile and current state.
-        Returns list of movie titles with reasons.
+        Returns list of movie titles with reasons. `background` marks speculative calls
+        nobody is waiting on, which are limited to AI_BACKGROUND_CONCURRENCY slots.
         """
-        if excluded_ids is None:
-            excluded_ids = []
-
-        prompt = f"""You are a movie recommendation expert. Based on the user's profile and current state,
-suggest movies that would be perfect for them right now.
-
-User Base Profile:
-- Emotions they like: {base_profile.get('emotions_like', [])}
-- Emotions they dislike: {base_profile.get('emotions_dislike', [])}
-- Complexity preference: {base_profile.get('complexity', 'any')}
-- Favorite movies: {base_profile.get('favorite_movies', '')}
-- Disliked movies: {base_profile.get('disliked_movies', '')}
-- Genres they like: {base_profile.get('genres_like', [])}
-- Genres they dislike: {base_profile.get('genres_dislike', [])}
-- Visual style: {base_profile.get('visual_style', '')}
-- Characters they like: {base_profile.get('characters_like', [])}
-- Characters they dislike: {base_profile.get('characters_dislike', [])}
-- Taboos: {base_profile.get('taboo', '')}
-- Desired afterfeel: {base_profile.get('afterfeel', [])}
-
-Current State:
-- Mood: {dynamic_state.get('mood', '')}
-- Energy level: {dynamic_state.get('energy', '')}
-- Watching with: {dynamic_state.get('company', '')}
-- Available time: {dynamic_state.get('time', '')}
-- Preference for new/classic: {dynamic_state.get('seen_preference', '')}
-- Specific request: {dynamic_state.get('specific_request', '')}
-
-Please recommend {count} movies. Language for reasons: {'Ukrainian' if lang == 'uk' else 'English'}.
-
-IMPORTANT: Return ONLY a valid JSON array. No additional text, no markdown, no explanation.
-Each movie should have: "title" (original English title), "year" (release year as number), "reason" (why you recommend it in user's language).
-
-Example format:
-[{{"title": "The Shawshank Redemption", "year": 1994, "reason": "Цей фільм подарує тобі надію..."}}]"""
+        request = self._recommendations_request(base_profile, dynamic_state, excluded_titles or [], count, lang)
 
         try:
-            message = self.client.messages.create(
-                model="claude-3-haiku-20240307",
-                max_tokens=1500,
-                messages=[
-                    {"role": "user", "content": prompt}
-                ]
+            message = await self._create_message(
+                request["messages"][0]["content"],
+                max_tokens=self._recommendations_max_tokens(count),
+                timeout=AI_RECOMMENDATIONS_TIMEOUT,
+                system=request["system"],
+                label="recommendations",
+                background=background
             )
 
             content = message.content[0].text.strip()
@@ -85,10 +304,71 @@ Example format:
         except json.JSONDecodeError as e:
             logger.error(f"JSON decode error: {e}")
             return []
+        except asyncio.TimeoutError:
+            logger.error("AI recommendation timed out")
+            return []
         except Exception as e:
             logger.error(f"AI recommendation error: {e}")
             return []
 
+    async def stream_recommendations(
+        self,
+        base_profile: dict,
+        dynamic_state: dict,
+        excluded_titles: list[str] = None,
+        count: int = 5,
+        lang: str = "uk",
+        background: bool = False
+    ) -> AsyncIterator[dict]:
+        """
+        Like generate_recommendations, but yield each recommendation as soon as the model
+        has finished writing it.
+        """
+        if not AI_STREAMING:
+            for recommendation in await self.generate_recommendations(
+                base_profile, dynamic_state, excluded_titles, count, lang, background
+            ):
+                yield recommendation
+            return
+
+        request = self._recommendations_request(base_profile, dynamic_state, excluded_titles or [], count, lang)
+        parser = JSONArrayStreamParser()
+        loop = asyncio.get_running_loop()
+        # The deadline also covers time spent waiting for a free slot
+        deadline = loop.time() + AI_RECOMMENDATIONS_TIMEOUT
+
+        try:
+            await asyncio.wait_for(self._acquire(background), timeout=AI_RECOMMENDATIONS_TIMEOUT)
+            try:
+                self.request_count += 1
+                async with self.client.messages.stream(
+                    model=AI_MODEL,
+                    max_tokens=self._recommendations_max_tokens(count),
+                    system=request["system"],
+                    messages=request["messages"],
+                    timeout=AI_RECOMMENDATIONS_TIMEOUT,
+                ) as stream:
+                    events = stream.__aiter__()
+                    while True:
+                        try:
+                            event = await asyncio.wait_for(events.__anext__(), timeout=deadline - loop.time())
+                        except StopAsyncIteration:
+                            break
+                        if event.type == "message_start":
+                            self._record_input_usage(event.message.usage, "recommendations stream")
+                        elif event.type == "message_delta":
+                            self.output_tokens += event.usage.output_tokens
+                        elif event.type == "content_block_delta" and event.delta.type == "text_delta":
+                            for recommendation in parser.feed(event.delta.text):
+                                yield recommendation
+            finally:
+                self._release(background)
+
+        except asyncio.TimeoutError:
+            logger.error("AI recommendation stream timed out")
+        except Exception as e:
+            logger.error(f"AI recommendation stream error: {e}")
+
     async def generate_recommendation_reason(
         self,
         movie: dict,
@@ -116,16 +396,18 @@ User likes genres: {base_profile.get('genres_like', [])}
 Why is this movie perfect for them right now? Reply with just the reason, no extra text."""
 
         try:
-            message = self.client.messages.create(
-                model="claude-3-haiku-20240307",
+            message = await self._create_message(
+                prompt,
                 max_tokens=200,
-                messages=[
-                    {"role": "user", "content": prompt}
-                ]
+                timeout=AI_REASON_TIMEOUT,
+                label="reason"
             )
 
             return message.content[0].text.strip()
 
+        except asyncio.TimeoutError:
+            logger.error("AI reason generation timed out")
+            return ""
         except Exception as e:
             logger.error(f"AI reason generation error: {e}")
             return ""
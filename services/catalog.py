@@ -0,0 +1,147 @@
+"""
+Local title -> TMDB id catalog built from TMDB daily ID exports.
+
+Ingest an export (a local path or a files.tmdb.org URL):
+
+    python -m services.catalog http://files.tmdb.org/p/exports/movie_ids_05_15_2024.json.gz
+
+Exports only carry original titles and popularity; release years are
+filled in as /search/movie results pass through TMDBService.
+"""
+import asyncio
+import gzip
+import json
+import logging
+import math
+import sys
+import tempfile
+from difflib import SequenceMatcher
+from typing import Optional
+
+import httpx
+
+from config import CATALOG_MIN_SCORE
+from database import Database
+from utils.helpers import normalize_title
+
+logger = logging.getLogger(__name__)
+
+INGEST_BATCH_SIZE = 10000
+
+
+def fts_query(title_norm: str) -> str:
+    """FTS5 query requiring every token of a normalized title."""
+    return " ".join(f'"{token}"' for token in title_norm.split())
+
+
+def match_score(row: dict, title_norm: str, year: Optional[int]) -> float:
+    """Title similarity in [0, 1], nudged up for an exact year and down for a clear mismatch."""
+    score = SequenceMatcher(None, title_norm, row["title_norm"]).ratio()
+    if year and row["year"]:
+        diff = abs(int(year) - row["year"])
+        if diff == 0:
+            score += 0.1
+        elif diff > 1:
+            score -= 0.5
+    return score
+
+
+async def resolve_title_locally(db: Database, title: str, year: Optional[int] = None) -> Optional[int]:
+    """Best catalog match for a title, or None if there is no confident match."""
+    if not db.catalog_available:
+        return None
+
+    title_norm = normalize_title(title)
+    if not title_norm:
+        return None
+
+    rows = await db.search_catalog(fts_query(title_norm))
+    if not rows:
+        return None
+
+    # Popularity only breaks ties between equally good title matches
+    ranked = sorted(
+        rows,
+        key=lambda row: (match_score(row, title_norm, year), math.log1p(row["popularity"] or 0)),
+        reverse=True
+    )
+    best = ranked[0]
+    if match_score(best, title_norm, year) < CATALOG_MIN_SCORE:
+        return None
+
+    # Remakes share a title; without a known year they cannot be told apart
+    if year and best["year"] is None:
+        same_title = [row for row in ranked if row["title_norm"] == best["title_norm"]]
+        if len(same_title) > 1:
+            return None
+
+    return best["tmdb_id"]
+
+
+async def _download(url: str) -> str:
+    """Stream a remote export to a temporary file and return its path."""
+    target = tempfile.NamedTemporaryFile(suffix=".json.gz", delete=False)
+    async with httpx.AsyncClient(timeout=None, follow_redirects=True) as client:
+        async with client.stream("GET", url) as response:
+            response.raise_for_status()
+            async for chunk in response.aiter_bytes():
+                target.write(chunk)
+    target.close()
+    return target.name
+
+
+async def ingest_export(db: Database, source: str) -> int:
+    """Stream a gzip JSONL TMDB ID export into the catalog; returns the number of titles stored."""
+    path = await _download(source) if source.startswith(("http://", "https://")) else source
+
+    total = 0
+    batch = []
+    with gzip.open(path, "rt", encoding="utf-8") as export:
+        for line in export:
+            try:
+                item = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if item.get("adult") or item.get("video"):
+                continue
+
+            title = item.get("original_title") or ""
+            title_norm = normalize_title(title)
+            if not title_norm:
+                continue
+
+            batch.append((item["id"], title, title_norm, None, item.get("popularity")))
+            if len(batch) >= INGEST_BATCH_SIZE:
+                await db.upsert_catalog_titles(batch)
+                total += len(batch)
+                batch = []
+                logger.info(f"Ingested {total} titles")
+
+    if batch:
+        await db.upsert_catalog_titles(batch)
+        total += len(batch)
+    return total
+
+
+async def main(source: str):
+    db = Database()
+    await db.connect()
+    try:
+        if not db.catalog_available:
+            logger.error("SQLite FTS5 is not available, cannot build the catalog")
+            return
+        total = await ingest_export(db, source)
+        logger.info(f"Catalog ready: {total} titles ingested")
+    finally:
+        await db.disconnect()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+    )
+    if len(sys.argv) != 2:
+        print("Usage: python -m services.catalog <movie_ids export .json.gz path or URL>")
+        sys.exit(1)
+    asyncio.run(main(sys.argv[1]))
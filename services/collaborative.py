@@ -0,0 +1,119 @@
+"""
+Offline collaborative filtering over saved/watched/recommendation feedback.
+
+Builds a user x movie interaction matrix, factorizes it with truncated SVD
+and stores the nearest neighbours of every movie in the movie_neighbors table.
+Run it periodically, e.g. from cron:
+
+    python -m services.collaborative
+"""
+import asyncio
+import logging
+
+import numpy as np
+from scipy.sparse import csr_matrix
+from scipy.sparse.linalg import svds
+
+from config import CF_FACTORS, CF_NEIGHBORS, CF_MIN_USERS
+from database import Database
+
+logger = logging.getLogger(__name__)
+
+
+def build_interaction_matrix(
+    interactions: list[tuple[int, int, float]],
+    min_users: int = CF_MIN_USERS
+) -> tuple[csr_matrix, np.ndarray]:
+    """Return the weighted user x movie matrix and the tmdb_id of each column."""
+    if not interactions:
+        return csr_matrix((0, 0), dtype=np.float32), np.array([], dtype=np.int64)
+
+    users = np.array([row[0] for row in interactions], dtype=np.int64)
+    movies = np.array([row[1] for row in interactions], dtype=np.int64)
+    weights = np.array([row[2] for row in interactions], dtype=np.float32)
+
+    # Movies seen by too few users only add noise to the neighbour lists
+    movie_ids, movie_cols, movie_counts = np.unique(movies, return_inverse=True, return_counts=True)
+    keep = movie_counts[movie_cols] >= min_users
+    users, movie_cols, weights = users[keep], movie_cols[keep], weights[keep]
+    _, user_rows = np.unique(users, return_inverse=True)
+
+    used_movies = np.unique(movie_cols)
+    remap = np.full(len(movie_ids), -1, dtype=np.int64)
+    remap[used_movies] = np.arange(len(used_movies))
+
+    matrix = csr_matrix(
+        (np.log1p(weights), (user_rows, remap[movie_cols])),
+        shape=(int(user_rows.max()) + 1 if len(user_rows) else 0, len(used_movies)),
+        dtype=np.float32
+    )
+    return matrix, movie_ids[used_movies]
+
+
+def item_factors(matrix: csr_matrix, factors: int = CF_FACTORS) -> np.ndarray:
+    """Truncated SVD item embeddings, L2-normalized so dot products are cosines."""
+    k = min(factors, min(matrix.shape) - 1)
+    if k < 1:
+        return np.zeros((matrix.shape[1], 0), dtype=np.float32)
+
+    _, singular_values, vt = svds(matrix, k=k)
+    embeddings = (vt.T * singular_values).astype(np.float32)
+    norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+    return embeddings / np.maximum(norms, 1e-8)
+
+
+def top_neighbors(
+    embeddings: np.ndarray,
+    movie_ids: np.ndarray,
+    count: int = CF_NEIGHBORS,
+    block_size: int = 1024
+) -> list[tuple[int, int, float]]:
+    """Top `count` most similar movies for every movie, as (tmdb_id, neighbor_id, score)."""
+    n = len(movie_ids)
+    if n < 2 or embeddings.shape[1] == 0:
+        return []
+
+    count = min(count, n - 1)
+    neighbors = []
+    for start in range(0, n, block_size):
+        block = embeddings[start:start + block_size]
+        scores = block @ embeddings.T
+        rows = np.arange(len(block))
+        scores[rows, start + rows] = -np.inf
+
+        top = np.argpartition(-scores, count - 1, axis=1)[:, :count]
+        for row, cols in enumerate(top):
+            for col in cols:
+                score = float(scores[row, col])
+                if score > 0:
+                    neighbors.append((int(movie_ids[start + row]), int(movie_ids[col]), score))
+    return neighbors
+
+
+async def rebuild_movie_neighbors(db: Database) -> int:
+    """Recompute and store item-item neighbour lists; returns the number of rows written."""
+    interactions = await db.get_interactions()
+    matrix, movie_ids = build_interaction_matrix(interactions)
+    logger.info(f"Interaction matrix: {matrix.shape[0]} users x {matrix.shape[1]} movies, {matrix.nnz} entries")
+
+    neighbors = top_neighbors(item_factors(matrix), movie_ids)
+    await db.replace_movie_neighbors(neighbors)
+    logger.info(f"Stored {len(neighbors)} movie neighbours")
+    return len(neighbors)
+
+
+async def main():
+    db = Database()
+    await db.connect()
+    try:
+        await rebuild_movie_neighbors(db)
+    finally:
+        await db.disconnect()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+    )
+    asyncio.run(main())
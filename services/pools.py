@@ -0,0 +1,216 @@
+"""
+Precomputed AI candidate pools per survey context and liked genre.
+
+Every (mood, energy, company, time, seen_preference) combination crossed with a
+liked-genre bucket can get a ranked, already resolved candidate pool, built during
+quiet hours under an LLM request/token budget. Contexts users actually picked
+recently are built first. The bot runs it daily; to run it by hand:
+
+    python -m services.pools
+"""
+import asyncio
+import itertools
+import logging
+import math
+from collections import Counter
+from datetime import datetime, timedelta
+
+from config import (
+    POOL_REFRESH_HOUR,
+    POOL_REQUEST_BUDGET,
+    POOL_TOKEN_BUDGET,
+    POOL_SIZE,
+    POOL_MAX_AGE,
+    POOL_DEMAND_DAYS,
+)
+from database import Database
+from services.ai_service import AIService
+from services.recommender import GENRE_COLUMNS, build_genre_weights
+from services.tmdb import TMDBService, TMDB_GENRE_IDS
+
+logger = logging.getLogger(__name__)
+
+# Answer keys of the dynamic survey (handlers/dynamic_survey.py), in bucket order
+SURVEY_ANSWERS = {
+    "mood": ["happy", "sad", "stressed", "bored", "romantic", "adventurous", "thoughtful", "tired"],
+    "energy": ["high", "medium", "low"],
+    "company": ["alone", "partner", "friends", "family", "kids"],
+    "time": ["short", "medium", "long", "series"],
+    "seen_preference": ["new", "classic", "any"],
+}
+
+GENRE_BUCKETS = list(TMDB_GENRE_IDS) + ["any"]
+
+
+def genre_bucket(genres_like: list[str]) -> str:
+    """The user's first liked genre known to TMDB, or "any"."""
+    for genre in genres_like:
+        if genre.lower() in TMDB_GENRE_IDS:
+            return genre.lower()
+    return "any"
+
+
+def pool_bucket(answers: tuple, genre: str, lang: str) -> str:
+    return "|".join(answers + (genre, lang))
+
+
+def context_answers(dynamic_answers: dict) -> tuple:
+    return tuple(dynamic_answers.get(key) or "" for key in SURVEY_ANSWERS)
+
+
+def personalize(pool: list[dict], profile: dict, dynamic_answers: dict, excluded_ids: set[int]) -> list[dict]:
+    """Re-rank a shared pool for one user by their genre weights, dropping seen and disliked picks."""
+    weights = build_genre_weights(profile, dynamic_answers)
+    scored = []
+    for rank, candidate in enumerate(pool):
+        if candidate["tmdb_id"] in excluded_ids:
+            continue
+        cols = [GENRE_COLUMNS[g] for g in candidate["genre_ids"] if g in GENRE_COLUMNS]
+        score = float(weights[cols].sum()) / math.sqrt(len(cols)) if cols else 0.0
+        # Disliked genres outweigh whatever the pool's context liked about it
+        if score < 0:
+            continue
+        scored.append((-score, rank, candidate))
+
+    scored.sort(key=lambda item: item[:2])
+    return [candidate for _, _, candidate in scored]
+
+
+def ranked_contexts(recent: list[dict]) -> list[tuple[tuple, str, str]]:
+    """(answers, genre, lang) contexts: recently demanded ones by frequency, then the full grid."""
+    demand = Counter(
+        (context_answers(ctx["dynamic_answers"]), genre_bucket(ctx["genres_like"]), ctx["language"])
+        for ctx in recent
+        if not (ctx["dynamic_answers"].get("specific_request") or "").strip()
+    )
+    contexts = [context for context, _ in demand.most_common()]
+
+    languages = Counter(ctx["language"] for ctx in recent)
+    lang = languages.most_common(1)[0][0] if languages else "uk"
+    known = set(contexts)
+    for answers in itertools.product(*SURVEY_ANSWERS.values()):
+        for genre in GENRE_BUCKETS:
+            if (answers, genre, lang) not in known:
+                contexts.append((answers, genre, lang))
+    return contexts
+
+
+async def build_pool(
+    tmdb: TMDBService,
+    ai: AIService,
+    answers: tuple,
+    genre: str,
+    lang: str
+) -> list[dict]:
+    """Ask the AI for one context and resolve its suggestions to a ranked pool."""
+    profile = {"genres_like": [genre] if genre != "any" else []}
+    dynamic_answers = dict(zip(SURVEY_ANSWERS, answers))
+    recommendations = await ai.generate_recommendations(profile, dynamic_answers, count=POOL_SIZE, lang=lang, background=True)
+
+    tmdb_language = "uk-UA" if lang == "uk" else "en-US"
+    results = await asyncio.gather(
+        *[tmdb.resolve_title(rec.get("title", ""), rec.get("year"), language=tmdb_language) for rec in recommendations],
+        return_exceptions=True
+    )
+
+    pool = []
+    seen = set()
+    for rec, result in zip(recommendations, results):
+        if isinstance(result, Exception):
+            logger.warning(f"Failed to resolve pool candidate: {result}")
+            continue
+        if not result or result[0]["id"] in seen:
+            continue
+        movie_data = result[0]
+        seen.add(movie_data["id"])
+        pool.append({
+            "tmdb_id": movie_data["id"],
+            "title": movie_data["title"],
+            "reason": rec.get("reason", ""),
+            "genre_ids": movie_data.get("genre_ids", []),
+        })
+    return pool
+
+
+async def refresh_candidate_pools(db: Database, tmdb: TMDBService, ai: AIService) -> int:
+    """Rebuild stale pools, most demanded first, until the budget runs out; returns pools built."""
+    start_requests = ai.request_count
+    start_tokens = ai.input_tokens + ai.output_tokens
+    built_at = await db.get_candidate_pool_times()
+    fresh_after = datetime.now() - timedelta(seconds=POOL_MAX_AGE / 2)
+
+    built = 0
+    for answers, genre, lang in ranked_contexts(await db.get_recent_session_contexts(POOL_DEMAND_DAYS)):
+        bucket = pool_bucket(answers, genre, lang)
+        if bucket in built_at and built_at[bucket] > fresh_after:
+            continue
+
+        requests = ai.request_count - start_requests
+        tokens = ai.input_tokens + ai.output_tokens - start_tokens
+        if requests >= POOL_REQUEST_BUDGET or tokens >= POOL_TOKEN_BUDGET:
+            logger.info(f"Candidate pool budget used up: {requests} requests, {tokens} tokens")
+            break
+
+        pool = await build_pool(tmdb, ai, answers, genre, lang)
+        if pool:
+            await db.replace_candidate_pool(bucket, pool)
+            built += 1
+
+    logger.info(f"Built {built} candidate pools")
+    return built
+
+
+async def get_pool(
+    db: Database,
+    profile: dict,
+    dynamic_answers: dict,
+    excluded_ids: set[int],
+    lang: str
+) -> list[dict]:
+    """Fresh precomputed pool for the user's context, personalized; empty if there is none."""
+    if (dynamic_answers.get("specific_request") or "").strip():
+        return []
+
+    bucket = pool_bucket(context_answers(dynamic_answers), genre_bucket(profile.get("genres_like", [])), lang)
+    pool, built_at = await db.get_candidate_pool(bucket)
+    if not pool or datetime.now() - built_at > timedelta(seconds=POOL_MAX_AGE):
+        return []
+    return personalize(pool, profile, dynamic_answers, excluded_ids)
+
+
+async def run_pool_scheduler(db: Database, tmdb: TMDBService, ai: AIService):
+    """Refresh candidate pools once a day at POOL_REFRESH_HOUR, local time."""
+    while True:
+        now = datetime.now()
+        next_run = now.replace(hour=POOL_REFRESH_HOUR, minute=0, second=0, microsecond=0)
+        if next_run <= now:
+            next_run += timedelta(days=1)
+        await asyncio.sleep((next_run - now).total_seconds())
+
+        try:
+            await refresh_candidate_pools(db, tmdb, ai)
+        except Exception as e:
+            logger.error(f"Candidate pool refresh failed: {e}")
+
+
+async def main():
+    db = Database()
+    await db.connect()
+    tmdb = TMDBService(db)
+    await tmdb.connect()
+    ai = AIService()
+    try:
+        await refresh_candidate_pools(db, tmdb, ai)
+        logger.info(f"AI usage: {ai.usage_stats()}")
+    finally:
+        await ai.close()
+        await tmdb.disconnect()
+        await db.disconnect()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+    )
+    asyncio.run(main())
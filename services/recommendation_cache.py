@@ -0,0 +1,105 @@
+import hashlib
+import json
+import re
+from typing import Optional
+
+from config import REC_CACHE_MAXSIZE, REC_CACHE_TTL, REC_CACHE_MAX_CANDIDATES
+from utils.cache import TTLCache
+from utils.helpers import normalize_title
+
+# Free-text profile fields make every key unique; they filter cached candidates per user instead
+FREE_TEXT_FIELDS = ("favorite_movies", "disliked_movies", "taboo")
+TEXT_SPLIT_RE = re.compile(r"[,;\n]+")
+
+
+def _canonical(value):
+    """Order- and case-insensitive form of a parsed profile value."""
+    if isinstance(value, str):
+        return value.strip().lower()
+    if isinstance(value, (list, tuple, set)):
+        return sorted(_canonical(item) for item in value)
+    if isinstance(value, dict):
+        return {key: _canonical(item) for key, item in value.items()}
+    return value
+
+
+def _text_items(text: Optional[str]) -> set[str]:
+    """Normalized entries of a comma, semicolon or newline separated free-text field."""
+    return {item for item in map(normalize_title, TEXT_SPLIT_RE.split(text or "")) if item}
+
+
+def context_key(profile: dict, dynamic_answers: dict, lang: str) -> Optional[str]:
+    """
+    Hash of the structured base profile fields, dynamic answers and reason language.
+    None when the user typed a specific request: free text makes the context unique.
+    """
+    if (dynamic_answers.get("specific_request") or "").strip():
+        return None
+
+    structured = {key: value for key, value in profile.items() if key not in FREE_TEXT_FIELDS}
+    answers = {key: value for key, value in dynamic_answers.items() if key != "specific_request"}
+    payload = json.dumps(
+        {"profile": _canonical(structured), "answers": _canonical(answers), "lang": lang},
+        sort_keys=True,
+        ensure_ascii=False
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class RecommendationCache:
+    """
+    Resolved AI candidates shared by every user with the same profile and survey answers.
+    The AI's reasons are not shared: they were written from the first user's free-text
+    favorites, dislikes and taboos, which the key leaves out.
+    """
+
+    def __init__(self, maxsize: int = REC_CACHE_MAXSIZE, ttl: float = REC_CACHE_TTL):
+        self._cache = TTLCache(maxsize, ttl)
+
+    def get(
+        self,
+        key: Optional[str],
+        excluded_ids: set[int],
+        profile: Optional[dict] = None,
+        reason: str = ""
+    ) -> list[dict]:
+        """
+        Cached candidates the user has not seen yet as {"tmdb_id", "title", "reason"} with the
+        given reason, minus the titles their favorite/disliked lists name or a taboo appears in.
+        """
+        if key is None:
+            return []
+
+        profile = profile or {}
+        named = _text_items(profile.get("favorite_movies")) | _text_items(profile.get("disliked_movies"))
+        taboos = _text_items(profile.get("taboo"))
+
+        candidates = []
+        for candidate in self._cache.get(key, []):
+            if candidate["tmdb_id"] in excluded_ids:
+                continue
+            title = normalize_title(candidate["title"])
+            if title in named:
+                continue
+            if any(f" {taboo} " in f" {title} " for taboo in taboos):
+                continue
+            candidates.append({**candidate, "reason": reason})
+        return candidates
+
+    def add(self, key: Optional[str], candidates: list[dict]):
+        if key is None or not candidates:
+            return
+
+        merged = list(self._cache.get(key, []))
+        known = {c["tmdb_id"] for c in merged}
+        for candidate in candidates:
+            if candidate["tmdb_id"] not in known:
+                known.add(candidate["tmdb_id"])
+                merged.append({"tmdb_id": candidate["tmdb_id"], "title": candidate["title"]})
+        self._cache.set(key, merged[-REC_CACHE_MAX_CANDIDATES:])
+
+    def stats(self) -> dict:
+        return self._cache.stats()
+
+
+recommendation_cache = RecommendationCache()
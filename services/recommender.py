@@ -0,0 +1,208 @@
+import asyncio
+import logging
+from datetime import date
+
+import numpy as np
+
+from config import LOCAL_POOL_PAGES, LOCAL_POOL_TTL
+from services.tmdb import TMDBService, TMDB_GENRE_IDS
+from utils.cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+# Column order of the genre matrix
+GENRE_COLUMNS = {genre_id: col for col, genre_id in enumerate(TMDB_GENRE_IDS.values())}
+
+# Genre weights implied by base profile and dynamic survey answers (keys from TMDB_GENRE_IDS)
+EMOTION_GENRES = {
+    "joy": {"comedy": 1.0, "family": 0.6, "animation": 0.5, "music": 0.5},
+    "excitement": {"action": 1.0, "adventure": 0.8, "thriller": 0.5, "scifi": 0.4},
+    "tension": {"thriller": 1.0, "crime": 0.6, "mystery": 0.6, "horror": 0.3},
+    "fear": {"horror": 1.0, "thriller": 0.5, "mystery": 0.3},
+    "sadness": {"drama": 1.0, "romance": 0.4, "war": 0.4},
+    "inspiration": {"drama": 0.6, "history": 0.6, "documentary": 0.6, "music": 0.4, "adventure": 0.3},
+    "romance": {"romance": 1.0, "comedy": 0.3, "drama": 0.3},
+    "nostalgia": {"family": 0.5, "animation": 0.5, "adventure": 0.4, "music": 0.3, "western": 0.3},
+    "curiosity": {"mystery": 0.8, "scifi": 0.8, "documentary": 0.6, "history": 0.3},
+    "relaxation": {"comedy": 0.7, "family": 0.6, "animation": 0.6, "romance": 0.3},
+}
+
+COMPLEXITY_GENRES = {
+    "simple": {"comedy": 0.3, "family": 0.3, "action": 0.2, "animation": 0.2},
+    "complex": {"mystery": 0.4, "scifi": 0.3, "drama": 0.3, "crime": 0.2},
+}
+
+MOOD_GENRES = {
+    "happy": {"comedy": 0.6, "adventure": 0.4, "music": 0.3},
+    "sad": {"comedy": 0.5, "family": 0.4, "animation": 0.4, "drama": 0.2},
+    "stressed": {"comedy": 0.6, "animation": 0.4, "family": 0.3, "horror": -0.6, "thriller": -0.4},
+    "bored": {"action": 0.5, "adventure": 0.5, "thriller": 0.4, "mystery": 0.3},
+    "romantic": {"romance": 0.9, "comedy": 0.3, "drama": 0.2},
+    "adventurous": {"adventure": 0.9, "action": 0.5, "fantasy": 0.5, "scifi": 0.4},
+    "thoughtful": {"drama": 0.6, "mystery": 0.4, "scifi": 0.4, "history": 0.4, "documentary": 0.4},
+    "tired": {"comedy": 0.5, "animation": 0.5, "family": 0.4, "war": -0.5, "horror": -0.4},
+}
+
+ENERGY_GENRES = {
+    "high": {"action": 0.4, "thriller": 0.3, "horror": 0.2, "adventure": 0.2},
+    "low": {"comedy": 0.3, "family": 0.2, "romance": 0.2, "action": -0.2, "war": -0.3},
+}
+
+COMPANY_GENRES = {
+    "kids": {"family": 1.0, "animation": 1.0, "horror": -2.0, "crime": -0.8, "war": -0.8, "thriller": -0.6},
+    "family": {"family": 0.6, "animation": 0.4, "adventure": 0.3, "horror": -1.0},
+    "partner": {"romance": 0.3, "comedy": 0.2},
+    "friends": {"comedy": 0.3, "action": 0.2, "horror": 0.2},
+}
+
+GENRE_LIKE_WEIGHT = 1.5
+GENRE_DISLIKE_WEIGHT = -2.5
+
+# Runtime bounds in minutes for each "time" answer, applied as discover filters
+TIME_RUNTIME = {
+    "short": (None, 100),
+    "medium": (80, 135),
+    "long": (110, None),
+}
+
+# Votes needed before a rating is trusted at full weight
+QUALITY_PRIOR_VOTES = 300
+
+_pool_cache = TTLCache(maxsize=256, ttl=LOCAL_POOL_TTL)
+
+
+def build_genre_weights(profile: dict, dynamic_answers: dict) -> np.ndarray:
+    """Turn a parsed base profile and dynamic answers into one weight per genre column."""
+    weights = np.zeros(len(GENRE_COLUMNS), dtype=np.float32)
+
+    def add(genres: dict, scale: float = 1.0):
+        for key, weight in genres.items():
+            genre_id = TMDB_GENRE_IDS.get(key)
+            if genre_id is not None:
+                weights[GENRE_COLUMNS[genre_id]] += weight * scale
+
+    for genre in profile.get("genres_like", []):
+        add({genre.lower(): GENRE_LIKE_WEIGHT})
+    for genre in profile.get("genres_dislike", []):
+        add({genre.lower(): GENRE_DISLIKE_WEIGHT})
+    for emotion in profile.get("emotions_like", []):
+        add(EMOTION_GENRES.get(emotion, {}), 0.5)
+    for emotion in profile.get("emotions_dislike", []):
+        add(EMOTION_GENRES.get(emotion, {}), -0.5)
+    add(COMPLEXITY_GENRES.get(profile.get("complexity"), {}))
+
+    add(MOOD_GENRES.get(dynamic_answers.get("mood"), {}))
+    add(ENERGY_GENRES.get(dynamic_answers.get("energy"), {}))
+    add(COMPANY_GENRES.get(dynamic_answers.get("company"), {}))
+
+    return weights
+
+
+def score_movies(movies: list[dict], genre_weights: np.ndarray, seen_preference: str = "any") -> np.ndarray:
+    """Score TMDB discover results against genre weights; higher is better."""
+    n = len(movies)
+    genres = np.zeros((n, len(GENRE_COLUMNS)), dtype=np.float32)
+    for row, movie in enumerate(movies):
+        for genre_id in movie.get("genre_ids", []):
+            col = GENRE_COLUMNS.get(genre_id)
+            if col is not None:
+                genres[row, col] = 1.0
+
+    vote_average = np.array([m.get("vote_average") or 0.0 for m in movies], dtype=np.float32)
+    vote_count = np.array([m.get("vote_count") or 0 for m in movies], dtype=np.float32)
+    popularity = np.log1p(np.array([m.get("popularity") or 0.0 for m in movies], dtype=np.float32))
+    years = np.array(
+        [int(m["release_date"][:4]) if m.get("release_date") else 0 for m in movies],
+        dtype=np.float32
+    )
+
+    # Dampen movies tagged with many genres so they don't win on tag count alone
+    genre_score = genres @ genre_weights / np.sqrt(np.maximum(genres.sum(axis=1), 1.0))
+    quality = (vote_average / 10.0) * (vote_count / (vote_count + QUALITY_PRIOR_VOTES))
+    popularity = popularity / max(float(popularity.max()), 1.0)
+
+    era = np.zeros(n, dtype=np.float32)
+    known = years > 0
+    if seen_preference == "new":
+        age = date.today().year - years
+        era = np.where(known, np.clip(1.0 - age / 10.0, -0.5, 1.0), 0.0).astype(np.float32)
+    elif seen_preference == "classic":
+        era = np.where(known & (years <= date.today().year - 15), 0.5, 0.0).astype(np.float32)
+        era += quality
+
+    return genre_score + 2.0 * quality + 0.3 * popularity + era
+
+
+class LocalRecommender:
+    """Rank a wide TMDB candidate pool against the user's profile without the LLM."""
+
+    def __init__(self, tmdb: TMDBService):
+        self.tmdb = tmdb
+
+    async def _candidate_pool(
+        self,
+        genre_weights: np.ndarray,
+        dynamic_answers: dict,
+        language: str
+    ) -> list[dict]:
+        runtime_min, runtime_max = TIME_RUNTIME.get(dynamic_answers.get("time"), (None, None))
+
+        # Pull pages for the strongest positive genres plus a genre-less popular slice
+        top_cols = [col for col in np.argsort(-genre_weights)[:3] if genre_weights[col] > 0]
+        genre_ids = list(GENRE_COLUMNS)
+        queries = [[genre_ids[col]] for col in top_cols] + [None]
+
+        cache_key = (tuple(q[0] if q else 0 for q in queries), runtime_min, runtime_max, language)
+        pool = _pool_cache.get(cache_key)
+        if pool is not None:
+            return pool
+
+        results = await asyncio.gather(
+            *[
+                self.tmdb.discover_movies(
+                    genres=genres,
+                    vote_count_min=100,
+                    runtime_min=runtime_min,
+                    runtime_max=runtime_max,
+                    page=page,
+                    language=language
+                )
+                for genres in queries
+                for page in range(1, LOCAL_POOL_PAGES + 1)
+            ],
+            return_exceptions=True
+        )
+
+        pool = {}
+        for result in results:
+            if isinstance(result, Exception):
+                logger.warning(f"Candidate pool request failed: {result}")
+                continue
+            for movie in result:
+                pool.setdefault(movie["id"], movie)
+
+        pool = list(pool.values())
+        if pool:
+            _pool_cache.set(cache_key, pool)
+        return pool
+
+    async def recommend(
+        self,
+        profile: dict,
+        dynamic_answers: dict,
+        excluded_ids: set[int],
+        language: str = "uk-UA",
+        count: int = 5
+    ) -> list[dict]:
+        """Return up to `count` discover results, best match first."""
+        genre_weights = build_genre_weights(profile, dynamic_answers)
+        pool = [
+            m for m in await self._candidate_pool(genre_weights, dynamic_answers, language)
+            if m["id"] not in excluded_ids
+        ]
+        if not pool:
+            return []
+
+        scores = score_movies(pool, genre_weights, dynamic_answers.get("seen_preference", "any"))
+        top = np.argsort(-scores)[:count]
+        return [pool[i] for i in top]
@@ -0,0 +1,179 @@
+import asyncio
+import logging
+import re
+import time
+from datetime import datetime
+from typing import Optional
+
+import numpy as np
+from scipy.sparse import csr_matrix
+
+from config import SIMILARITY_REFRESH_INTERVAL
+from database import Database
+from utils.background import spawn
+from utils.helpers import normalize_title
+
+logger = logging.getLogger(__name__)
+
+TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+TITLE_SPLIT_RE = re.compile(r"[,;\n]+")
+
+STOPWORDS = {
+    "the", "and", "for", "with", "his", "her", "their", "who", "when", "from", "into",
+    "that", "this", "they", "them", "has", "have", "are", "was", "but", "not", "after",
+    "while", "its", "one", "two", "must", "where", "what", "which", "all", "out", "about",
+}
+
+# How many times a field's tokens are counted in a document
+FIELD_WEIGHTS = {"genre": 3, "director": 3, "cast": 1, "title": 1, "overview": 1}
+
+
+def _words(text: Optional[str]) -> list[str]:
+    return [w for w in TOKEN_RE.findall((text or "").lower()) if len(w) > 2 and w not in STOPWORDS]
+
+
+def movie_terms(details: dict) -> dict[str, int]:
+    """Term counts of a normalized movie dict (as produced by TMDBService)."""
+    terms: dict[str, int] = {}
+
+    def add(term: str, weight: int):
+        terms[term] = terms.get(term, 0) + weight
+
+    # Names are kept whole so "Nolan" the director does not match "nolan" in an overview
+    for genre in details.get("genres") or []:
+        add(f"g:{genre.lower()}", FIELD_WEIGHTS["genre"])
+    for name in details.get("directors") or []:
+        add(f"d:{name.lower()}", FIELD_WEIGHTS["director"])
+    for name in details.get("cast") or []:
+        add(f"c:{name.lower()}", FIELD_WEIGHTS["cast"])
+    for word in _words(details.get("title")) + _words(details.get("original_title")):
+        add(word, FIELD_WEIGHTS["title"])
+    for word in _words(details.get("overview")):
+        add(word, FIELD_WEIGHTS["overview"])
+    return terms
+
+
+class SimilarityIndex:
+    """Sparse TF-IDF index over cached TMDB metadata with cosine top-k queries."""
+
+    def __init__(self):
+        self.vocabulary: dict[str, int] = {}
+        self.doc_terms: dict[int, dict[int, int]] = {}
+        self.titles: dict[str, int] = {}
+        self.movie_ids = np.array([], dtype=np.int64)
+        self.rows: dict[int, int] = {}
+        self.matrix = csr_matrix((0, 0), dtype=np.float32)
+        self._last_fetched_at: Optional[datetime] = None
+        self._last_refresh = 0.0
+        # Serializes refreshes: the worker thread reads doc_terms while it builds
+        self._refresh_lock = asyncio.Lock()
+
+    def add_movie(self, tmdb_id: int, details: dict):
+        """Add or merge a movie document; call build() afterwards."""
+        terms = self.doc_terms.setdefault(tmdb_id, {})
+        for term, count in movie_terms(details).items():
+            col = self.vocabulary.setdefault(term, len(self.vocabulary))
+            # Rows for several languages of one movie are merged, not summed
+            terms[col] = max(terms.get(col, 0), count)
+
+        for title in (details.get("title"), details.get("original_title")):
+            if title:
+                self.titles[normalize_title(title)] = tmdb_id
+
+    def build(self):
+        """Recompute the TF-IDF matrix from the stored term counts."""
+        self.movie_ids, self.rows, self.matrix = self._compute_matrix()
+
+    def _compute_matrix(self) -> tuple[np.ndarray, dict[int, int], csr_matrix]:
+        """(movie_ids, rows, matrix) for the stored term counts; touches no index attributes."""
+        movie_ids = np.fromiter(self.doc_terms.keys(), dtype=np.int64, count=len(self.doc_terms))
+        rows = {int(tmdb_id): row for row, tmdb_id in enumerate(movie_ids)}
+
+        indptr = [0]
+        indices = []
+        counts = []
+        for tmdb_id in movie_ids:
+            terms = self.doc_terms[int(tmdb_id)]
+            indices.extend(terms.keys())
+            counts.extend(terms.values())
+            indptr.append(len(indices))
+
+        n_docs, n_terms = len(movie_ids), len(self.vocabulary)
+        tf = csr_matrix(
+            (1.0 + np.log(np.array(counts, dtype=np.float32)), indices, indptr),
+            shape=(n_docs, n_terms)
+        )
+        df = np.bincount(np.array(indices, dtype=np.int64), minlength=n_terms)
+        idf = (np.log((n_docs + 1) / (df + 1)) + 1.0).astype(np.float32)
+
+        matrix = tf.multiply(idf).tocsr()
+        norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+        matrix = csr_matrix(matrix.multiply(1.0 / np.maximum(norms, 1e-8)[:, None]))
+        return movie_ids, rows, matrix.astype(np.float32)
+
+    async def refresh(self, db: Database, force: bool = False):
+        """
+        Index movie_cache rows added since the last refresh, at most every SIMILARITY_REFRESH_INTERVAL.
+        Only the first build is awaited; later ones run in the background on the current index.
+        """
+        now = time.monotonic()
+        if not force and now - self._last_refresh < SIMILARITY_REFRESH_INTERVAL:
+            return
+        self._last_refresh = now
+
+        if self.matrix.shape[0] == 0 or force:
+            await self._refresh(db)
+        else:
+            spawn(self._refresh(db), name="similarity-refresh")
+
+    async def _refresh(self, db: Database):
+        async with self._refresh_lock:
+            rows = await db.get_cached_movie_details_since(self._last_fetched_at)
+            if not rows:
+                return
+
+            for row in rows:
+                self.add_movie(row["tmdb_id"], row["details"])
+                if self._last_fetched_at is None or row["details_fetched_at"] > self._last_fetched_at:
+                    self._last_fetched_at = row["details_fetched_at"]
+            # The rebuild is CPU-bound; keep it off the event loop and swap the result in at once
+            self.movie_ids, self.rows, self.matrix = await asyncio.to_thread(self._compute_matrix)
+        logger.info(f"Similarity index: {len(self.movie_ids)} movies, {len(self.vocabulary)} terms")
+
+    def resolve_titles(self, text: str) -> list[int]:
+        """Map a free-text list of titles (comma, semicolon or newline separated) to indexed movies."""
+        found = []
+        for title in TITLE_SPLIT_RE.split(text or ""):
+            tmdb_id = self.titles.get(normalize_title(title))
+            if tmdb_id is not None and tmdb_id not in found:
+                found.append(tmdb_id)
+        return found
+
+    def similar(
+        self,
+        like_ids: list[int],
+        dislike_ids: list[int] = (),
+        exclude_ids: set[int] = frozenset(),
+        k: int = 10
+    ) -> list[tuple[int, float]]:
+        """Top-k movies closest to the `like_ids` centroid, pushed away from `dislike_ids`."""
+        like_rows = [self.rows[i] for i in like_ids if i in self.rows]
+        if not like_rows or self.matrix.shape[0] == 0:
+            return []
+
+        query = np.asarray(self.matrix[like_rows].mean(axis=0)).ravel()
+        dislike_rows = [self.rows[i] for i in dislike_ids if i in self.rows]
+        if dislike_rows:
+            query -= 0.5 * np.asarray(self.matrix[dislike_rows].mean(axis=0)).ravel()
+
+        scores = self.matrix @ query
+        skip = [self.rows[i] for i in set(like_ids) | set(dislike_ids) | set(exclude_ids) if i in self.rows]
+        scores[skip] = -np.inf
+
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(int(self.movie_ids[i]), float(scores[i])) for i in top if scores[i] > 0]
+
+
+similarity_index = SimilarityIndex()
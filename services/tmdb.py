@@ -1,27 +1,135 @@
+import asyncio
+import logging
 import httpx
+from datetime import datetime, timedelta
 from typing import Optional
-from config import TMDB_API_KEY, TMDB_BASE_URL, TMDB_IMAGE_BASE_URL
+from config import (
+    TMDB_API_KEY,
+    TMDB_BASE_URL,
+    TMDB_IMAGE_BASE_URL,
+    TMDB_TIMEOUT,
+    TMDB_MAX_CONNECTIONS,
+    TMDB_MAX_KEEPALIVE_CONNECTIONS,
+    TMDB_KEEPALIVE_EXPIRY,
+    TMDB_HTTP2,
+    TMDB_CACHE_MAXSIZE,
+    TMDB_CACHE_TTL,
+    MOVIE_CACHE_MAX_AGE,
+    TITLE_MEMO_TTL,
+    TITLE_MEMO_NEGATIVE_TTL,
+)
+from database import Database
+from services.catalog import resolve_title_locally
+from utils.cache import TTLCache
+from utils.helpers import normalize_title
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+
+def years_match(expected, actual) -> bool:
+    """True if either year is unknown or they differ by at most one (festival vs. release dates)."""
+    try:
+        return abs(int(expected) - int(actual)) <= 1
+    except (TypeError, ValueError):
+        return True
 
 
 class TMDBService:
-    def __init__(self):
+    def __init__(self, db: Optional[Database] = None):
+        # Optional persistent metadata cache (movie_cache table)
+        self.db = db
         self.api_key = TMDB_API_KEY
         self.base_url = TMDB_BASE_URL
         self.image_base_url = TMDB_IMAGE_BASE_URL
+        self.client: Optional[httpx.AsyncClient] = None
+        self.details_cache = TTLCache(TMDB_CACHE_MAXSIZE, TMDB_CACHE_TTL)
+        self.trailer_cache = TTLCache(TMDB_CACHE_MAXSIZE, TMDB_CACHE_TTL)
+        # Single-flight: identical concurrent GETs share one in-flight task
+        self._inflight: dict[tuple, asyncio.Task] = {}
+        self.request_count = 0
+        self.coalesced_count = 0
+        self.catalog_hits = 0
+        self.catalog_misses = 0
+        self.memo_hits = 0
+
+    async def connect(self):
+        """Open the shared pooled HTTP client."""
+        if self.client is not None:
+            return
+
+        limits = httpx.Limits(
+            max_connections=TMDB_MAX_CONNECTIONS,
+            max_keepalive_connections=TMDB_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=TMDB_KEEPALIVE_EXPIRY,
+        )
+        try:
+            self.client = httpx.AsyncClient(
+                base_url=self.base_url,
+                limits=limits,
+                timeout=TMDB_TIMEOUT,
+                http2=TMDB_HTTP2,
+            )
+        except ImportError:
+            # http2=True needs the optional "h2" package
+            logger.warning("HTTP/2 support is not installed, falling back to HTTP/1.1")
+            self.client = httpx.AsyncClient(
+                base_url=self.base_url,
+                limits=limits,
+                timeout=TMDB_TIMEOUT,
+            )
+
+    async def disconnect(self):
+        if self.client:
+            await self.client.aclose()
+            self.client = None
 
     async def _request(self, endpoint: str, params: dict = None) -> dict:
         if params is None:
             params = {}
-        params["api_key"] = self.api_key
 
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                f"{self.base_url}{endpoint}",
-                params=params,
-                timeout=30.0
-            )
-            response.raise_for_status()
-            return response.json()
+        key = (endpoint, tuple(sorted((k, str(v)) for k, v in params.items())))
+        task = self._inflight.get(key)
+        if task is not None:
+            self.coalesced_count += 1
+        else:
+            self.request_count += 1
+            task = asyncio.ensure_future(self._fetch(endpoint, params))
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._request_done(key, t))
+
+        # Shield so one cancelled caller does not cancel the request for the others
+        return await asyncio.shield(task)
+
+    def _request_done(self, key: tuple, task: asyncio.Task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        # Mark the exception as retrieved in case every waiter was cancelled
+        if not task.cancelled():
+            task.exception()
+
+    async def _fetch(self, endpoint: str, params: dict) -> dict:
+        if self.client is None:
+            await self.connect()
+
+        response = await self.client.get(
+            endpoint,
+            params={**params, "api_key": self.api_key}
+        )
+        response.raise_for_status()
+        return response.json()
+
+    def request_stats(self) -> dict:
+        """Counters of network requests issued, calls collapsed onto one in flight and local title lookups."""
+        return {
+            "requests": self.request_count,
+            "coalesced": self.coalesced_count,
+            "in_flight": len(self._inflight),
+            "catalog_hits": self.catalog_hits,
+            "catalog_misses": self.catalog_misses,
+            "memo_hits": self.memo_hits,
+        }
 
     async def search_movie(self, title: str, language: str = "uk-UA") -> list[dict]:
         """Search for movies by title."""
@@ -29,45 +137,240 @@ class TMDBService:
             "/search/movie",
             {"query": title, "language": language}
         )
-        return data.get("results", [])
+        results = data.get("results", [])
+        await self._remember_titles(results)
+        return results
+
+    async def _remember_titles(self, results: list[dict]):
+        """Feed search results back into the local catalog; TMDB exports carry no release years."""
+        if self.db is None or not self.db.catalog_available:
+            return
+
+        titles = []
+        for result in results:
+            title = result.get("original_title") or result.get("title") or ""
+            title_norm = normalize_title(title)
+            if not title_norm or result.get("adult"):
+                continue
+            year = int(result["release_date"][:4]) if result.get("release_date") else None
+            titles.append((result["id"], title, title_norm, year, result.get("popularity")))
+
+        if titles:
+            try:
+                await self.db.upsert_catalog_titles(titles)
+            except Exception as e:
+                logger.warning(f"Failed to update title catalog: {e}")
+
+    async def find_catalog_id(self, title: str, year: Optional[int] = None) -> Optional[int]:
+        """TMDB id of a title from the local catalog, or None to fall back to /search/movie."""
+        if self.db is None:
+            return None
+        try:
+            tmdb_id = await resolve_title_locally(self.db, title, year)
+        except Exception as e:
+            logger.warning(f"Catalog lookup failed for {title!r}: {e}")
+            return None
+
+        if tmdb_id is None:
+            self.catalog_misses += 1
+        else:
+            self.catalog_hits += 1
+        return tmdb_id
+
+    @staticmethod
+    def _memo_key(title: str, year) -> tuple[str, int]:
+        try:
+            memo_year = int(year) if year else 0
+        except (TypeError, ValueError):
+            memo_year = 0
+        return normalize_title(title), memo_year
+
+    async def get_title_resolution(self, title: str, year=None) -> tuple[bool, Optional[int]]:
+        """(known, tmdb_id) for an AI (title, year) resolved before; tmdb_id is None if it was not found."""
+        if self.db is None:
+            return False, None
+
+        title_norm, memo_year = self._memo_key(title, year)
+        memo = await self.db.get_title_resolution(title_norm, memo_year)
+        if memo is None:
+            return False, None
+
+        ttl = TITLE_MEMO_TTL if memo["tmdb_id"] is not None else TITLE_MEMO_NEGATIVE_TTL
+        if datetime.now() - memo["resolved_at"] >= timedelta(seconds=ttl):
+            return False, None
+
+        self.memo_hits += 1
+        return True, memo["tmdb_id"]
+
+    async def remember_title_resolution(self, title: str, year, tmdb_id: Optional[int]):
+        """Memoize how an AI (title, year) resolved; pass None to record "not found"."""
+        if self.db is None:
+            return
+
+        title_norm, memo_year = self._memo_key(title, year)
+        if not title_norm:
+            return
+        try:
+            await self.db.save_title_resolution(title_norm, memo_year, tmdb_id)
+        except Exception as e:
+            logger.warning(f"Failed to memoize title resolution for {title!r}: {e}")
+
+    async def resolve_title(
+        self,
+        title: str,
+        year=None,
+        excluded_ids: set[int] = frozenset(),
+        language: str = "uk-UA"
+    ) -> Optional[tuple[dict, Optional[str]]]:
+        """
+        Resolve a suggested (title, year) to (movie_data, trailer_url): memo table first,
+        then the local catalog, then /search/movie. None if unknown or excluded.
+        """
+        # Titles resolved before cost no TMDB lookups at all
+        known, tmdb_id = await self.get_title_resolution(title, year)
+        if known:
+            if tmdb_id is None or tmdb_id in excluded_ids:
+                return None
+            return await self._load_resolved(tmdb_id, language)
+
+        # Resolve the title in the local catalog first
+        tmdb_id = await self.find_catalog_id(title, year)
+        if tmdb_id is not None:
+            movie_data, trailer_url = await self.get_movie_bundle(tmdb_id, language)
+            # Catalog rows may lack a year, so check it against the loaded details
+            if movie_data and years_match(year, movie_data.get("year")):
+                await self.remember_title_resolution(title, year, tmdb_id)
+                if tmdb_id in excluded_ids:
+                    return None
+                return movie_data, trailer_url
+
+        # Search in TMDB
+        search_results = await self.search_movie(title, language)
+
+        for result in search_results:
+            result_year = result.get("release_date", "")[:4]
+            if year and result_year and str(year) != result_year:
+                continue
+
+            # The first result matching the year is the movie that was meant
+            tmdb_id = result.get("id")
+            await self.remember_title_resolution(title, year, tmdb_id)
+            if tmdb_id in excluded_ids:
+                return None
+            return await self._load_resolved(tmdb_id, language)
+
+        await self.remember_title_resolution(title, year, None)
+        return None
+
+    async def _load_resolved(self, tmdb_id: int, language: str) -> Optional[tuple[dict, Optional[str]]]:
+        movie_data, trailer_url = await self.get_movie_bundle(tmdb_id, language)
+        if not movie_data:
+            return None
+        return movie_data, trailer_url
+
+    def _normalize_movie(self, data: dict) -> dict:
+        """Convert a raw /movie/{id} response into the card dict used by handlers."""
+        return {
+            "id": data.get("id"),
+            "title": data.get("title"),
+            "original_title": data.get("original_title"),
+            "overview": data.get("overview"),
+            "release_date": data.get("release_date"),
+            "year": data.get("release_date", "")[:4] if data.get("release_date") else None,
+            "runtime": data.get("runtime"),
+            "vote_average": round(data.get("vote_average", 0), 1),
+            "poster_path": data.get("poster_path"),
+            "poster_url": f"{self.image_base_url}{data.get('poster_path')}" if data.get("poster_path") else None,
+            "genres": [g["name"] for g in data.get("genres", [])],
+            "genre_ids": [g["id"] for g in data.get("genres", [])],
+            "tagline": data.get("tagline"),
+            "budget": data.get("budget"),
+            "revenue": data.get("revenue"),
+            "production_countries": [c["name"] for c in data.get("production_countries", [])],
+            "directors": [
+                c["name"] for c in data.get("credits", {}).get("crew", [])
+                if c.get("job") == "Director"
+            ],
+            "cast": [
+                c["name"] for c in data.get("credits", {}).get("cast", [])[:5]
+            ],
+        }
+
+    @staticmethod
+    def _is_fresh(fetched_at: Optional[datetime]) -> bool:
+        return fetched_at is not None and datetime.now() - fetched_at < timedelta(seconds=MOVIE_CACHE_MAX_AGE)
+
+    @staticmethod
+    def _is_current(details: Optional[dict]) -> bool:
+        # Details normalized before genre_ids existed only carry localized genre names; refetch them
+        return bool(details) and "genre_ids" in details
+
+    async def _get_stored_movie(self, tmdb_id: int, language: str) -> Optional[dict]:
+        if self.db is None:
+            return None
+        try:
+            return await self.db.get_cached_movie(tmdb_id, language)
+        except Exception as e:
+            logger.warning(f"Movie cache read failed: {e}")
+            return None
+
+    async def _store_details(self, tmdb_id: int, language: str, details: dict):
+        if self.db is None:
+            return
+        try:
+            await self.db.cache_movie_details(tmdb_id, language, details)
+        except Exception as e:
+            logger.warning(f"Movie cache write failed: {e}")
+
+    async def _store_trailer(self, tmdb_id: int, language: str, trailer_url: Optional[str]):
+        if self.db is None:
+            return
+        try:
+            await self.db.cache_movie_trailer(tmdb_id, language, trailer_url)
+        except Exception as e:
+            logger.warning(f"Movie cache write failed: {e}")
 
     async def get_movie_details(self, tmdb_id: int, language: str = "uk-UA") -> Optional[dict]:
         """Get detailed movie information."""
+        cache_key = (tmdb_id, language)
+        cached = self.details_cache.get(cache_key)
+        if self._is_current(cached):
+            # Callers annotate the dict (e.g. ai_reason), so hand out a copy
+            return dict(cached)
+
+        stored = await self._get_stored_movie(tmdb_id, language)
+        if stored and self._is_current(stored["details"]) and self._is_fresh(stored["details_fetched_at"]):
+            self.details_cache.set(cache_key, stored["details"])
+            return dict(stored["details"])
+
         try:
             data = await self._request(
                 f"/movie/{tmdb_id}",
                 {"language": language, "append_to_response": "credits"}
             )
-
-            return {
-                "id": data.get("id"),
-                "title": data.get("title"),
-                "original_title": data.get("original_title"),
-                "overview": data.get("overview"),
-                "release_date": data.get("release_date"),
-                "year": data.get("release_date", "")[:4] if data.get("release_date") else None,
-                "runtime": data.get("runtime"),
-                "vote_average": round(data.get("vote_average", 0), 1),
-                "poster_path": data.get("poster_path"),
-                "poster_url": f"{self.image_base_url}{data.get('poster_path')}" if data.get("poster_path") else None,
-                "genres": [g["name"] for g in data.get("genres", [])],
-                "tagline": data.get("tagline"),
-                "budget": data.get("budget"),
-                "revenue": data.get("revenue"),
-                "production_countries": [c["name"] for c in data.get("production_countries", [])],
-                "directors": [
-                    c["name"] for c in data.get("credits", {}).get("crew", [])
-                    if c.get("job") == "Director"
-                ],
-                "cast": [
-                    c["name"] for c in data.get("credits", {}).get("cast", [])[:5]
-                ],
-            }
+            movie = self._normalize_movie(data)
         except Exception:
+            # Serve stale metadata rather than nothing while TMDB is unavailable
+            if stored and stored["details"]:
+                return dict(stored["details"])
             return None
 
+        self.details_cache.set(cache_key, movie)
+        await self._store_details(tmdb_id, language, movie)
+        return dict(movie)
+
     async def get_movie_trailer(self, tmdb_id: int, language: str = "uk-UA") -> Optional[str]:
         """Get YouTube trailer URL for a movie."""
+        cache_key = (tmdb_id, language)
+        cached = self.trailer_cache.get(cache_key, _MISSING)
+        if cached is not _MISSING:
+            return cached
+
+        stored = await self._get_stored_movie(tmdb_id, language)
+        if stored and self._is_fresh(stored["trailer_fetched_at"]):
+            self.trailer_cache.set(cache_key, stored["trailer_url"])
+            return stored["trailer_url"]
+
         try:
             # Try Ukrainian first
             data = await self._request(
@@ -84,19 +387,92 @@ class TMDBService:
                 )
                 videos = data.get("results", [])
 
-            # Find trailer
-            for video in videos:
-                if video.get("type") == "Trailer" and video.get("site") == "YouTube":
-                    return f"https://www.youtube.com/watch?v={video.get('key')}"
+            trailer_url = self._pick_trailer(videos)
+        except Exception:
+            if stored and stored["trailer_fetched_at"]:
+                return stored["trailer_url"]
+            return None
+
+        # "No trailer" is cached too; request errors above are not
+        self.trailer_cache.set(cache_key, trailer_url)
+        await self._store_trailer(tmdb_id, language, trailer_url)
+        return trailer_url
 
-            # Fallback to any YouTube video
-            for video in videos:
-                if video.get("site") == "YouTube":
-                    return f"https://www.youtube.com/watch?v={video.get('key')}"
+    @staticmethod
+    def _pick_trailer(videos: list[dict]) -> Optional[str]:
+        # Find trailer
+        for video in videos:
+            if video.get("type") == "Trailer" and video.get("site") == "YouTube":
+                return f"https://www.youtube.com/watch?v={video.get('key')}"
 
-            return None
+        # Fallback to any YouTube video
+        for video in videos:
+            if video.get("site") == "YouTube":
+                return f"https://www.youtube.com/watch?v={video.get('key')}"
+
+        return None
+
+    async def get_movie_bundle(
+        self,
+        tmdb_id: int,
+        language: str = "uk-UA"
+    ) -> tuple[Optional[dict], Optional[str]]:
+        """
+        Get movie details and trailer URL in a single request.
+        Returns (movie card dict, trailer URL); the dict is None if the movie could not be loaded.
+        """
+        cache_key = (tmdb_id, language)
+        cached = self.details_cache.get(cache_key)
+        cached_trailer = self.trailer_cache.get(cache_key, _MISSING)
+        if self._is_current(cached) and cached_trailer is not _MISSING:
+            return dict(cached), cached_trailer
+
+        stored = await self._get_stored_movie(tmdb_id, language)
+        if (
+            stored and self._is_current(stored["details"])
+            and self._is_fresh(stored["details_fetched_at"])
+            and self._is_fresh(stored["trailer_fetched_at"])
+        ):
+            self.details_cache.set(cache_key, stored["details"])
+            self.trailer_cache.set(cache_key, stored["trailer_url"])
+            return dict(stored["details"]), stored["trailer_url"]
+
+        lang_code = language.split("-")[0]
+        try:
+            data = await self._request(
+                f"/movie/{tmdb_id}",
+                {
+                    "language": language,
+                    "append_to_response": "credits,videos",
+                    # Videos are otherwise filtered to `language` only; add English for the fallback
+                    "include_video_language": ",".join(dict.fromkeys([lang_code, "en"])),
+                }
+            )
+            movie = self._normalize_movie(data)
+
+            # Same preference as get_movie_trailer: user's language first, then English
+            videos = data.get("videos", {}).get("results", [])
+            preferred = [v for v in videos if v.get("iso_639_1") == lang_code]
+            if not preferred:
+                preferred = [v for v in videos if v.get("iso_639_1") == "en"]
+            trailer_url = self._pick_trailer(preferred)
         except Exception:
-            return None
+            if stored and stored["details"]:
+                return dict(stored["details"]), stored["trailer_url"]
+            return None, None
+
+        self.details_cache.set(cache_key, movie)
+        self.trailer_cache.set(cache_key, trailer_url)
+        await self._store_details(tmdb_id, language, movie)
+        await self._store_trailer(tmdb_id, language, trailer_url)
+        return dict(movie), trailer_url
+
+    def cache_stats(self) -> dict:
+        """Hit/miss/eviction counters of the in-memory caches."""
+        return {
+            "details": self.details_cache.stats(),
+            "trailers": self.trailer_cache.stats(),
+        }
 
     async def discover_movies(
         self,
@@ -104,6 +480,9 @@ class TMDBService:
         year_from: int = None,
         year_to: int = None,
         vote_average_min: float = None,
+        vote_count_min: int = None,
+        runtime_min: int = None,
+        runtime_max: int = None,
         sort_by: str = "popularity.desc",
         page: int = 1,
         language: str = "uk-UA"
@@ -124,6 +503,12 @@ class TMDBService:
             params["primary_release_date.lte"] = f"{year_to}-12-31"
         if vote_average_min:
             params["vote_average.gte"] = vote_average_min
+        if vote_count_min:
+            params["vote_count.gte"] = vote_count_min
+        if runtime_min:
+            params["with_runtime.gte"] = runtime_min
+        if runtime_max:
+            params["with_runtime.lte"] = runtime_max
 
         data = await self._request("/discover/movie", params)
         return data.get("results", [])
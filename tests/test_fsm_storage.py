@@ -0,0 +1,46 @@
+import asyncio
+from datetime import datetime
+
+from aiogram.fsm.storage.base import StorageKey
+
+from database import Database, SQLiteStorage
+
+KEY = StorageKey(bot_id=1, chat_id=2, user_id=3)
+
+
+def test_cold_read_does_not_overwrite_concurrent_update(tmp_path):
+    async def scenario():
+        db = Database(str(tmp_path / "bot.db"))
+        await db.connect()
+        try:
+            # State persisted before a restart, so the new storage starts cold
+            await db.save_fsm_records([(SQLiteStorage._key(KEY), "step1", {}, datetime.now())])
+            storage = SQLiteStorage(db, flush_interval=3600)
+
+            get_fsm_record = db.get_fsm_record
+            read_done = asyncio.Event()
+            release_read = asyncio.Event()
+
+            async def slow_get_fsm_record(key):
+                # Only the first read stalls; the concurrent update reads normally
+                db.get_fsm_record = get_fsm_record
+                row = await get_fsm_record(key)
+                read_done.set()
+                await release_read.wait()
+                return row
+
+            db.get_fsm_record = slow_get_fsm_record
+            slow_read = asyncio.create_task(storage.get_state(KEY))
+            await read_done.wait()
+            await storage.set_state(KEY, "step2")
+            release_read.set()
+            assert await slow_read == "step2"
+
+            await storage.flush()
+            assert await storage.get_state(KEY) == "step2"
+            assert (await db.get_fsm_record(SQLiteStorage._key(KEY)))["state"] == "step2"
+            await storage.close()
+        finally:
+            await db.disconnect()
+
+    asyncio.run(scenario())
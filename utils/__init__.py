@@ -1,3 +1,12 @@
-from .helpers import format_movie_card, parse_list_from_json
+from .helpers import format_movie_card, parse_list_from_json, normalize_title
+from .cache import TTLCache
+from .background import spawn, cancel_background_tasks
 
-__all__ = ["format_movie_card", "parse_list_from_json"]
+__all__ = [
+    "format_movie_card",
+    "parse_list_from_json",
+    "normalize_title",
+    "TTLCache",
+    "spawn",
+    "cancel_background_tasks",
+]
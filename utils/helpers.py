@@ -1,4 +1,6 @@
 import json
+import re
+import unicodedata
 from typing import Optional
 from locales import get_text
 
@@ -77,6 +79,13 @@ def parse_list_from_json(value: Optional[str]) -> list:
         return []
 
 
+def normalize_title(title: str) -> str:
+    """Lowercase a title, fold accents and drop punctuation: "Amélie!" -> "amelie"."""
+    folded = unicodedata.normalize("NFKD", title or "")
+    folded = "".join(ch for ch in folded if not unicodedata.combining(ch))
+    return " ".join(re.findall(r"\w+", folded.lower()))
+
+
 def escape_markdown(text: str) -> str:
     """Escape special characters for Telegram MarkdownV2."""
     special_chars = ['_', '*', '[', ']', '(', ')', '~', '`', '>', '#', '+', '-', '=', '|', '{', '}', '.', '!']